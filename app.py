@@ -2,12 +2,14 @@ import streamlit as st
 from datetime import datetime
 import os
 
-# Importa as funções da lógica principal e as funções utilitárias
-from scraper_logic import run_with_logging_and_state
+# Importa as funções utilitárias. A lógica principal (scraper, Gemini, Notion) só é
+# importada quando uma análise é iniciada, para que cada rerun do Streamlit seja rápido.
 from utils import (
     load_config, save_config, load_profiles, save_profiles, 
     load_env_vars, save_env_vars, LOG_FILE
 )
+from run_progress import load_progress, start_background_run, tail_log, MAX_TAIL_BYTES
+from metrics import load_metrics_history
 
 # --- Configuração da Página ---
 st.set_page_config(page_title="X-Insight Engine", layout="wide")
@@ -67,15 +69,52 @@ with left_col:
     else:
         st.info("Nenhuma análise executada ainda.")
 
-    if st.button("▶️ Iniciar Análise Manual", use_container_width=True, type="primary"):
-        with st.spinner("Análise em andamento... Isso pode levar alguns minutos."):
-            profiles_to_scan = load_profiles()
-            if not profiles_to_scan:
-                st.error("Nenhum perfil para analisar. Adicione e salve um perfil ao lado.")
-            else:
-                posts_sent = run_with_logging_and_state(profiles_to_scan, run_type="manual")
-                st.toast(f"Análise Concluída! {posts_sent} posts enviados para o Notion.", icon="🎉")
+    progress = load_progress()
+    run_active = bool(progress) and progress["status"] == "running"
+
+    # A análise roda em um processo separado: a interface continua responsiva e a execução
+    # não é interrompida se a aba for fechada.
+    if st.button("▶️ Iniciar Análise Manual", use_container_width=True, type="primary", disabled=run_active):
+        profiles_to_scan = load_profiles()
+        missing_keys = [key for key, value in load_env_vars().items() if not value]
+        if not profiles_to_scan:
+            st.error("Nenhum perfil para analisar. Adicione e salve um perfil ao lado.")
+        elif missing_keys:
+            st.error(f"Configuração incompleta: {', '.join(missing_keys)}. Preencha as chaves de API na barra lateral.")
+        else:
+            run_id = start_background_run(run_type="manual")
+            st.toast(f"Análise iniciada em segundo plano (ID {run_id}).", icon="🚀")
+            st.rerun()
+
+    # Atualiza só este bloco a cada 2s enquanto houver uma execução em andamento.
+    @st.fragment(run_every=2 if run_active else None)
+    def show_progress():
+        progress = load_progress()
+        if not progress:
+            return
+        if progress["status"] == "running":
+            st.caption(f"Execução {progress['run_id']} ({progress['run_type']}) — etapa: {progress['stage']}")
+            profiles_total = progress["profiles_total"] or 1
+            st.progress(min(progress["profiles_done"] / profiles_total, 1.0),
+                        text=f"Perfis verificados: {progress['profiles_done']}/{progress['profiles_total']}")
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Posts encontrados", progress["posts_discovered"])
+            col2.metric("Threads extraídas", progress["posts_extracted"])
+            col3.metric("Classificados", progress["posts_classified"], f"{progress['posts_relevant']} relevantes", delta_color="off")
+            col4.metric("Entregas pendentes", progress["deliveries_pending"])
+        else:
+            if st.session_state.get("watched_run_id") == progress["run_id"]:
+                # A execução acompanhada acabou: recarrega a página inteira para atualizar o status.
+                st.session_state.watched_run_id = None
                 st.rerun()
+            if progress["status"] == "failed":
+                st.error(f"A execução {progress['run_id']} falhou: {progress['error']}")
+            elif progress["status"] == "interrupted":
+                st.warning(f"A execução {progress['run_id']} foi interrompida antes de terminar.")
+        if progress["status"] == "running":
+            st.session_state.watched_run_id = progress["run_id"]
+
+    show_progress()
 
 # --- COLUNA DIREITA: Gerenciamento de Perfis ---
 with right_col:
@@ -133,18 +172,84 @@ with right_col:
         with col_save:
             if st.form_submit_button("💾 Salvar Alterações", type="primary", use_container_width=True):
                 valid_profiles = [p for p in st.session_state.profiles if p['name'].strip()]
-                save_profiles(valid_profiles)
+                changed_profiles = save_profiles(valid_profiles)
                 st.session_state.profiles = valid_profiles
                 st.toast("Lista de perfis atualizada com sucesso!", icon="📝")
+                # Contextos editados: só os posts recentes desses perfis são reclassificados, em segundo plano.
+                if changed_profiles:
+                    if run_active or not all(load_env_vars().values()):
+                        st.toast(f"Contexto alterado em {len(changed_profiles)} perfis. A reclassificação fica pendente para a próxima rodada.", icon="⏳")
+                    else:
+                        run_id = start_background_run(run_type="reclassify")
+                        st.toast(f"Reclassificando {', '.join(changed_profiles)} em segundo plano (ID {run_id}).", icon="🔁")
                 st.rerun()
 
 
 # --- Seção de Logs (Abaixo das colunas) ---
 st.markdown("---")
 with st.expander("📄 Ver Logs da Última Execução"):
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            log_content = f.read()
-        st.code(log_content, language="log")
+    # O log é lido incrementalmente: cada atualização só lê as linhas novas desde a anterior.
+    @st.fragment(run_every=2 if run_active else None)
+    def show_log():
+        if not os.path.exists(LOG_FILE):
+            st.warning("Nenhum arquivo de log encontrado. Execute uma análise para gerá-lo.")
+            return
+        current_run_id = (load_progress() or {}).get("run_id")
+        if st.session_state.get("log_run_id") != current_run_id:
+            st.session_state.log_run_id = current_run_id
+            st.session_state.log_offset = 0
+            st.session_state.log_content = ""
+        new_text, st.session_state.log_offset = tail_log(LOG_FILE, st.session_state.log_offset)
+        st.session_state.log_content = (st.session_state.log_content + new_text)[-MAX_TAIL_BYTES:]
+        st.code(st.session_state.log_content, language="log")
+
+    show_log()
+
+# --- Seção de Métricas (histórico de execuções) ---
+# Tempos acumulados nas threads de cada tipo de trabalho: mostram se a execução gasta o tempo
+# baixando páginas, esperando limitadores ou aguardando a cota do Gemini.
+METRIC_STAGE_LABELS = {
+    "fetch_http": "Download HTTP",
+    "fetch_browser": "Download via navegador",
+    "fetch_throttle_wait": "Espera do limitador por instância",
+    "gemini_requests": "Requisições ao Gemini",
+    "gemini_quota_wait": "Espera de cota do Gemini",
+    "gemini_backoff_wait": "Backoff do Gemini",
+    "notion_requests": "Requisições ao Notion",
+    "notion_rate_limit_wait": "Espera do limite do Notion",
+}
+
+with st.expander("📊 Métricas das Execuções"):
+    history = load_metrics_history(limit=50)
+    if not history:
+        st.info("Nenhuma métrica registrada ainda. Execute uma análise para gerá-las.")
     else:
-        st.warning("Nenhum arquivo de log encontrado. Execute uma análise para gerá-lo.")
\ No newline at end of file
+        import pandas as pd
+        run_times = [datetime.fromtimestamp(record["started_at"]) for record in history]
+        st.caption("Duração total das execuções (segundos)")
+        st.line_chart(pd.DataFrame({"Duração": [record["duration_seconds"] for record in history]}, index=run_times))
+        st.caption("Tempo por tipo de trabalho (segundos somados entre as threads)")
+        breakdown = pd.DataFrame(
+            [{label: record["stage_seconds"].get(key, 0.0) for key, label in METRIC_STAGE_LABELS.items()} for record in history],
+            index=run_times,
+        )
+        st.bar_chart(breakdown)
+        # Tokens enviados ao Gemini, quanto veio do cache de contexto e quanto a compactação de threads economizou.
+        st.caption("Tokens do Gemini por execução")
+        st.bar_chart(pd.DataFrame(
+            [{"Entrada": record["counters"].get("llm_prompt_tokens", 0),
+              "Do cache do Gemini": record["counters"].get("llm_cached_tokens", 0),
+              "Economizados na compactação": record["counters"].get("llm_tokens_trimmed", 0)} for record in history],
+            index=run_times,
+        ))
+
+        last_run = history[-1]
+        st.caption(f"Última execução ({last_run.get('run_id', '-')}, {last_run.get('status', '-')})")
+        col1, col2, col3, col4 = st.columns(4)
+        counters = last_run["counters"]
+        col1.metric("Páginas baixadas", sum(counters.get("pages_fetched", {}).values()) + sum(counters.get("browser_pages_fetched", {}).values()))
+        col2.metric("Chamadas ao Gemini", counters.get("llm_calls", 0), f"{counters.get('llm_retries', 0)} novas tentativas", delta_color="off")
+        col3.metric("Cache de vereditos", counters.get("verdict_cache_hits", 0), f"{counters.get('verdict_cache_misses', 0)} falhas", delta_color="off")
+        col4.metric("Requisições ao Notion", counters.get("notion_requests", 0), f"{counters.get('notion_retries', 0)} novas tentativas", delta_color="off")
+        if last_run["latency"]:
+            st.dataframe(pd.DataFrame(last_run["latency"]).T[["count", "avg", "p50", "p95", "max"]], use_container_width=True)
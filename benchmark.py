@@ -0,0 +1,423 @@
+"""
+Benchmark de ponta a ponta do run_full_analysis, sem rede.
+
+Um servidor HTTP local imita o HTML do Nitter (perfis e threads com
+profundidade de respostas variável), e o modelo do Gemini e o cliente do
+Notion são substituídos por dublês com latência configurável e injeção de
+erros 429. Cada escala roda em um diretório temporário próprio, para que os
+arquivos de estado do projeto não sejam tocados.
+
+Uso:
+    python benchmark.py --scales 10,100,1000 --output bench.json
+    python benchmark.py --baseline bench.json --max-regression 0.2   # falha (exit 1) se ficar mais lento
+    python benchmark.py --check-parity    # compara o parser rápido com o parse completo nas páginas geradas
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_DIR)
+
+import gemini_analyzer
+import notion_handler
+import scraper_logic
+from metrics import metrics
+
+# --- Constantes ---
+DEFAULT_SCALES = "10,100"
+POSTS_PER_PROFILE = 3
+MAX_REPLY_DEPTH = 3
+STATUS_ID_STRIDE = 100          # IDs reservados por post: raiz + respostas da cadeia
+RELEVANT_SHARE = 0.3            # Fração de posts ambíguos que o dublê do Gemini marca como relevantes
+# Configuração de referência: limites de cota altos para medir o pipeline, não o limitador.
+BENCHMARK_CONFIG = {
+    "min_request_interval": 0,
+    "max_requests_per_instance": 16,
+    "scrape_workers": 8,
+    "gemini_rpm": 100000,
+    "gemini_tpm": 0,
+    "gemini_batch_linger_seconds": 1,
+    "deliver_linger_seconds": 1,
+    "export_json": False,
+}
+
+WORDS = ("points quest bridge mainnet season rewards vault staking liquidity testnet badge galxe "
+         "validator campaign leaderboard referral swap governance proposal epoch multiplier "
+         "wallet deposit ecosystem partner launch chain update community holders").split()
+
+
+# --- Servidor Nitter local ---
+def nitter_date(dt):
+    return dt.strftime("%b %d, %Y · %I:%M %p UTC").replace(" 0", " ")
+
+
+def post_text(status_id):
+    # ~10% ruído trivial e ~10% com palavra-chave relevante (decididos pelo pré-filtro); o resto vai ao Gemini.
+    rng = random.Random(status_id)
+    kind = rng.random()
+    if kind < 0.1:
+        return "gm fam"
+    if kind < 0.2:
+        return f"The claim for season {rng.randint(1, 9)} is live, check your wallet eligibility now"
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))) + f" #{status_id}"
+
+
+def timeline_item(user, status_id, posted_at, classes="timeline-item"):
+    return (
+        f'<div class="{classes}"><a class="tweet-link" href="/{user}/status/{status_id}#m"></a>'
+        f'<div class="tweet-body"><span class="tweet-date"><a href="/{user}/status/{status_id}#m" '
+        f'title="{nitter_date(posted_at)}">1h</a></span>'
+        f'<div class="tweet-content media-body">{post_text(status_id)}</div>'
+        f'<div class="attachments"><div class="attachment image"><a href="#"><img src="/pic/{status_id}.jpg"></a></div></div>'
+        f'</div></div>'
+    )
+
+
+def page(body):
+    return (f'<!DOCTYPE html><html><head><title>nitter</title></head><body><nav class="nav-bar">nitter</nav>'
+            f'<div class="container">{body}</div><footer>nitter</footer></body></html>')
+
+
+class NitterFixtures:
+    """
+    Gera páginas no formato do Nitter de forma determinística. O post k do
+    perfil u é a resposta mais profunda de uma cadeia de `depth` níveis; a
+    raiz da cadeia tem `depth` continuações na thread.
+    """
+
+    def __init__(self, profiles, posts_per_profile=POSTS_PER_PROFILE, max_depth=MAX_REPLY_DEPTH):
+        self.profiles = profiles
+        self.posts_per_profile = posts_per_profile
+        self.max_depth = max_depth
+        self.now = datetime.now(timezone.utc)
+
+    def username(self, index):
+        return f"bench{index}"
+
+    def chain(self, user_index, post_index):
+        root_id = (user_index + 1) * 1_000_000 + post_index * STATUS_ID_STRIDE
+        depth = post_index % (self.max_depth + 1)
+        return root_id, depth
+
+    def posted_at(self, status_id):
+        return self.now - timedelta(minutes=status_id % 600 + 1)
+
+    def profile_page(self, user_index):
+        user = self.username(user_index)
+        items = []
+        for post_index in range(self.posts_per_profile):
+            root_id, depth = self.chain(user_index, post_index)
+            # Threads próprias aparecem na timeline com classes compostas, como no Nitter.
+            classes = ("timeline-item", "timeline-item thread", "thread-last timeline-item")[post_index % 3]
+            items.append(timeline_item(user, root_id + depth, self.posted_at(root_id + depth), classes))
+        return page(f'<div class="timeline">{"".join(items)}</div>')
+
+    def status_page(self, user, status_id):
+        root_id = status_id - status_id % STATUS_ID_STRIDE
+        before = ""
+        if status_id != root_id:
+            # Cada nível de resposta aponta para o anterior: a resolução da raiz custa um download por nível.
+            before = (f'<div class="before-tweet thread-line">'
+                      f'{timeline_item(user, status_id - 1, self.posted_at(status_id - 1))}</div>')
+        main = f'<div class="main-tweet">{timeline_item(user, status_id, self.posted_at(status_id))}</div>'
+        after = ""
+        if status_id == root_id:
+            depth = (root_id % 1_000_000) // STATUS_ID_STRIDE % (self.max_depth + 1)
+            continuations = "".join(
+                timeline_item(user, root_id + level, self.posted_at(root_id + level),
+                              "thread-last timeline-item" if level == depth else "timeline-item thread")
+                for level in range(1, depth + 1))
+            after = f'<div class="after-tweet thread-line">{continuations}</div>'
+        return page(f'<div class="conversation"><div class="main-thread">{before}{main}{after}</div></div>')
+
+    def parity_pages(self):
+        """Páginas de referência para o check_parity: perfil, raiz com continuações e resposta."""
+        user = self.username(0)
+        root_id, _ = self.chain(0, self.max_depth)
+        return {
+            "profile.html": self.profile_page(0),
+            "thread_root.html": self.status_page(user, root_id),
+            "thread_reply.html": self.status_page(user, root_id + self.max_depth),
+            "profile_empty.html": page('<div class="timeline"><h2 class="timeline-none">No items found</h2></div>'),
+            "profile_not_found.html": page(f'<div class="error-panel"><span>User "{user}x" not found</span></div>'),
+            "thread_deleted.html": page('<div class="error-panel"><span>Tweet not found</span></div>'),
+        }
+
+
+def serve_fixtures(fixtures):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            status_match = re.match(r'^/(bench\d+)/status/(\d+)', self.path)
+            profile_match = re.match(r'^/bench(\d+)/?$', self.path)
+            if status_match:
+                body = fixtures.status_page(status_match.group(1), int(status_match.group(2)))
+            elif profile_match:
+                body = fixtures.profile_page(int(profile_match.group(1)))
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Dublês do Gemini e do Notion ---
+class FakeGeminiModel:
+    """Responde ao prompt em lote com um veredito por post_id, com latência e 429 injetados."""
+
+    def __init__(self, latency=0.2, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota). retry_delay { seconds: 1 }")
+        post_ids = re.findall(r'=== POST post_id="([^"]+)" ===', prompt)
+        verdicts = [{"post_id": post_id, "relevance": "yes" if random.Random(post_id).random() < RELEVANT_SHARE else "no"}
+                    for post_id in post_ids]
+        return _FakeResponse(json.dumps(verdicts), len(prompt) // 4)
+
+
+class _FakeResponse:
+    def __init__(self, text, tokens):
+        self.text = text
+        self.usage_metadata = type("Usage", (), {"total_token_count": tokens})()
+
+
+class FakeNotionClient:
+    """Imita blocks.children.append do notion_client, com latência e respostas rate_limited injetadas."""
+
+    def __init__(self, latency=0.1, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.blocks = self
+        self.children = self
+
+    def append(self, block_id, children):
+        import httpx
+        import notion_client
+        self.requests += 1
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            response = httpx.Response(429, headers={"retry-after": "0.2"})
+            raise notion_client.errors.APIResponseError(response, "Rate limited", "rate_limited")
+        return {"results": children}
+
+
+def install_stand_ins(model, notion):
+    gemini_analyzer.get_model = lambda: model
+    scraper_logic.get_model = gemini_analyzer.get_model
+    notion_handler.get_notion_client = lambda: (notion, "benchmark-page")
+    scraper_logic.get_notion_client = notion_handler.get_notion_client
+
+
+class TimedRun(scraper_logic.StreamingRun):
+    """StreamingRun que registra o tempo entre a descoberta de cada post e o seu veredito."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.discovered_at = {}
+        self.post_seconds = []
+
+    def discover(self, profile, emit):
+        def timed_emit(post):
+            self.discovered_at[post["status_id"]] = time.monotonic()
+            emit(post)
+        super().discover(profile, timed_emit)
+
+    def _record_verdict(self, post, is_relevant, emit, label):
+        super()._record_verdict(post, is_relevant, emit, label)
+        started_at = self.discovered_at.get(post.get("status_id"))
+        if started_at is not None:
+            self.post_seconds.append(time.monotonic() - started_at)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+# --- Execução ---
+def run_scale(profile_count, args):
+    fixtures = NitterFixtures(profile_count, args.posts_per_profile, args.max_depth)
+    server = serve_fixtures(fixtures)
+    model = FakeGeminiModel(args.gemini_latency, args.gemini_429_rate)
+    notion = FakeNotionClient(args.notion_latency, args.notion_429_rate)
+    install_stand_ins(model, notion)
+
+    work_dir = tempfile.mkdtemp(prefix="x_insight_bench_")
+    previous_dir = os.getcwd()
+    profiles = [{"name": fixtures.username(index), "context": ""} for index in range(profile_count)]
+    config = dict(BENCHMARK_CONFIG, nitter_instances=[f"http://127.0.0.1:{server.server_port}"], **args.config)
+    timed_runs = []
+
+    def make_run(*run_args, **run_kwargs):
+        timed_runs.append(TimedRun(*run_args, **run_kwargs))
+        return timed_runs[-1]
+
+    original_run_class = scraper_logic.StreamingRun
+    scraper_logic.StreamingRun = make_run
+    try:
+        os.chdir(work_dir)
+        shutil.copy(os.path.join(PROJECT_DIR, "prefilter_rules.json"), work_dir)
+        with open("config.json", 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        if args.trace_memory:
+            tracemalloc.start()
+        started_at = time.monotonic()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                scraper_logic.run_full_analysis(profiles)
+            finally:
+                sys.stdout = stdout
+        elapsed = time.monotonic() - started_at
+        traced_peak = None
+        if args.trace_memory:
+            traced_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+    finally:
+        scraper_logic.StreamingRun = original_run_class
+        os.chdir(previous_dir)
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    run = timed_runs[-1]
+    snapshot = metrics.snapshot()
+    posts = len(run.post_seconds)
+    return {
+        "profiles": profile_count,
+        "posts": posts,
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(posts / elapsed, 2) if elapsed else 0.0,
+        "p50_post_seconds": round(percentile(run.post_seconds, 0.5), 3),
+        "p95_post_seconds": round(percentile(run.post_seconds, 0.95), 3),
+        "pages_fetched": sum(snapshot["counters"].get("pages_fetched", {}).values()),
+        "llm_calls": model.calls,
+        "notion_requests": notion.requests,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_traced_mb": traced_peak,
+    }
+
+
+def compare_with_baseline(results, baseline_path, max_regression):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {entry["profiles"]: entry for entry in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["profiles"])
+        if not reference or not reference["posts_per_second"]:
+            continue
+        change = result["posts_per_second"] / reference["posts_per_second"] - 1
+        print(f"{result['profiles']:>6} perfis: {change:+.1%} de vazão em relação à referência")
+        if change < -max_regression:
+            regressions.append(result["profiles"])
+    return regressions
+
+
+def check_fixture_parity(args):
+    """Roda o check_parity do nitter_parser sobre as páginas geradas e as salvas em tests/. Retorna as divergências."""
+    from nitter_parser import check_parity
+    fixtures = NitterFixtures(1, max(args.posts_per_profile, 3), max(args.max_depth, 2))
+    directory = tempfile.mkdtemp(prefix="xinsight-parity-")
+    try:
+        saved_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "nitter")
+        paths = sorted(glob.glob(os.path.join(saved_dir, "*.html")))
+        for name, html_content in fixtures.parity_pages().items():
+            paths.append(os.path.join(directory, name))
+            with open(paths[-1], 'w', encoding='utf-8') as f:
+                f.write(html_content)
+        return check_parity(paths)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline do X-Insight Engine.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="Números de perfis separados por vírgula (ex.: 10,100,1000).")
+    parser.add_argument("--posts-per-profile", type=int, default=POSTS_PER_PROFILE)
+    parser.add_argument("--max-depth", type=int, default=MAX_REPLY_DEPTH, help="Profundidade máxima das cadeias de respostas.")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--notion-latency", type=float, default=0.1)
+    parser.add_argument("--notion-429-rate", type=float, default=0.0)
+    parser.add_argument("--config", type=json.loads, default={}, help="JSON com chaves de config.json a sobrescrever.")
+    parser.add_argument("--trace-memory", action="store_true", help="Mede o pico de memória Python com tracemalloc (mais lento).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Arquivo JSON onde salvar os resultados.")
+    parser.add_argument("--baseline", help="Resultados anteriores (JSON) para comparar a vazão.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Queda de vazão tolerada em relação à referência.")
+    parser.add_argument("--check-parity", action="store_true", help="Só verifica a paridade do parser nas páginas geradas.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.check_parity:
+        return 1 if check_fixture_parity(args) else 0
+    random.seed(args.seed)
+    results = []
+    print(f"{'perfis':>8} {'posts':>7} {'tempo(s)':>9} {'posts/s':>8} {'p50(s)':>7} {'p95(s)':>7} {'páginas':>8} {'LLM':>5} {'Notion':>7} {'RSS(MB)':>8}")
+    for scale in [int(value) for value in args.scales.split(",") if value.strip()]:
+        result = run_scale(scale, args)
+        results.append(result)
+        print(f"{result['profiles']:>8} {result['posts']:>7} {result['seconds']:>9} {result['posts_per_second']:>8} "
+              f"{result['p50_post_seconds']:>7} {result['p95_post_seconds']:>7} {result['pages_fetched']:>8} "
+              f"{result['llm_calls']:>5} {result['notion_requests']:>7} {result['peak_rss_mb'] or '-':>8}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"created_at": datetime.now().isoformat(), "args": vars(args), "results": results}, f, indent=4)
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"!!! Regressão de desempenho acima de {args.max_regression:.0%} nas escalas: {regressions}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import hashlib
+import re
+import threading
+import time
+
+# --- Constantes ---
+SIMHASH_BITS = 64
+LSH_BANDS = 8                 # 8 bandas de 8 bits: distância <= 7 garante ao menos uma banda idêntica
+HAMMING_THRESHOLD = 7         # Distância máxima entre assinaturas (textos sem relação ficam acima de ~25)
+SHINGLE_SIZE = 3
+MIN_WORDS = 8                 # Textos curtos demais ("GM") não entram no índice, para evitar falsos positivos
+DEDUP_MAX_AGE_DAYS = 30
+
+
+def _normalize_words(text):
+    text = re.sub(r'https?://\S+', ' ', text.lower())
+    return re.findall(r'\w+', text)
+
+
+def _to_signed(value):
+    """O SQLite guarda inteiros de 64 bits com sinal."""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << SIMHASH_BITS) if value < 0 else value
+
+
+def simhash(text):
+    """Assinatura SimHash de 64 bits sobre shingles de palavras; None se o texto for curto demais."""
+    words = _normalize_words(text)
+    if len(words) < MIN_WORDS:
+        return None
+    weights = [0] * SIMHASH_BITS
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def band_keys(signature):
+    band_bits = SIMHASH_BITS // LSH_BANDS
+    mask = (1 << band_bits) - 1
+    return [signature >> (band * band_bits) & mask for band in range(LSH_BANDS)]
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateIndex:
+    """
+    Índice persistido (tabela simhash_index do Store) de assinaturas SimHash das
+    threads, com busca LSH por bandas. Cada thread recebe um cluster; a primeira
+    thread de um cluster é a canônica e as demais são colapsadas nela. Os perfis
+    de origem de um cluster são lidos do banco na hora da entrega (outbox).
+    """
+
+    def __init__(self, store, threshold=HAMMING_THRESHOLD, max_age_days=DEDUP_MAX_AGE_DAYS):
+        self.store = store
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.store.evict_simhashes(time.time() - max_age_days * 86400)
+
+    def assign(self, post_data, thread_id, text):
+        """
+        Registra a thread no índice e retorna o ID do cluster. Se o retorno for
+        diferente de `thread_id`, a thread é quase-duplicata de outra já vista.
+        """
+        signature = simhash(text)
+        username = post_data["username"]
+        with self._lock:
+            if signature is None:
+                return thread_id
+            bands = band_keys(signature)
+            cluster_id = thread_id
+            for candidate_id, candidate_hash, candidate_cluster in self.store.find_simhash_candidates(bands):
+                if candidate_id != thread_id and hamming_distance(signature, _to_unsigned(candidate_hash)) <= self.threshold:
+                    cluster_id = candidate_cluster
+                    break
+            self.store.add_simhash(thread_id, username, _to_signed(signature), bands, cluster_id, time.time())
+            if cluster_id != thread_id:
+                self.duplicates += 1
+            return cluster_id
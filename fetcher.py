@@ -0,0 +1,357 @@
+import atexit
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+try:
+    import psutil
+except ImportError:  # O psutil está no requirements.txt; sem ele os navegadores são reciclados só pelo número de páginas.
+    psutil = None
+
+# --- Constantes ---
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 10
+# Limites por instância do Nitter, para que nenhum host seja sobrecarregado no modo concorrente.
+MAX_REQUESTS_PER_INSTANCE = 2
+MIN_REQUEST_INTERVAL = 0.5
+# Ciclo de vida dos navegadores Selenium.
+DRIVER_CACHE_FILE = "driver_cache.json"
+DRIVER_PATH_TTL_DAYS = 7            # Após esse tempo o webdriver_manager é consultado de novo
+BROWSER_POOL_SIZE = 1
+MAX_PAGES_PER_BROWSER = 200         # O navegador é reiniciado depois de carregar tantas páginas
+MAX_BROWSER_MEMORY_MB = 1500        # ... ou quando o processo (com filhos) passa desse uso de memória
+# Elementos que indicam que a página do Nitter terminou de carregar, ou que é uma página de erro.
+READY_SELECTORS = {
+    "profile": "div.timeline-item, .timeline-none, div.error-panel",
+    "thread": "div.main-thread, div.error-panel",
+}
+BROWSER_READY_TIMEOUTS = {"profile": 15, "thread": 10}
+
+# Trechos que indicam uma página de desafio JS (Cloudflare, Anubis, etc.) em vez do HTML do Nitter.
+CHALLENGE_MARKERS = (
+    "just a moment...",
+    "checking your browser",
+    "cf-browser-verification",
+    "challenge-platform",
+    "making sure you&#39;re not a bot",
+    "making sure you're not a bot",
+    "anubis",
+    "enable javascript and cookies to continue",
+)
+
+
+def get_host(url):
+    """Retorna 'esquema://host' de uma URL, usado como chave por instância."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def is_challenge_page(html_content):
+    """Verifica se o HTML recebido é uma página de desafio que exige JavaScript."""
+    if not html_content:
+        return False
+    head = html_content[:20000].lower()
+    if 'class="timeline-item' in head or 'class="main-thread' in head:
+        return False
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+class HostLimiter:
+    """Limita as requisições simultâneas e o intervalo mínimo entre requisições de cada host."""
+
+    def __init__(self, max_concurrent=MAX_REQUESTS_PER_INSTANCE, min_interval=MIN_REQUEST_INTERVAL):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    def _semaphore_for(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrent)
+            return self._semaphores[host]
+
+    def acquire(self, host):
+        self._semaphore_for(host).acquire()
+        # Reserva o próximo horário livre do host e espera fora do lock.
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start_at + self.min_interval
+        if start_at > now:
+            metrics.add_time("fetch_throttle_wait", start_at - now)
+            time.sleep(start_at - now)
+
+    def release(self, host):
+        self._semaphore_for(host).release()
+
+
+class HttpFetcher:
+    """Backend HTTP com sessões keep-alive (uma por thread) e pool de conexões por host."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    def _get_session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            })
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def fetch(self, url):
+        """Baixa a página e retorna (status_code, html)."""
+        response = self._get_session().get(url, timeout=self.timeout)
+        # Sem charset no cabeçalho o requests assume ISO-8859-1 e corrompe o "·" das datas do Nitter.
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = 'utf-8'
+        return response.status_code, response.text
+
+    def close(self):
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+        self._local = threading.local()
+
+
+def resolve_driver_path(cache_path=DRIVER_CACHE_FILE, ttl_days=DRIVER_PATH_TTL_DAYS):
+    """
+    Retorna o caminho do ChromeDriver. O webdriver_manager (que resolve a versão
+    e pode baixar o binário) só é consultado quando o cache expira ou o arquivo some.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if os.path.exists(cached["path"]) and time.time() - cached["resolved_at"] < ttl_days * 86400:
+            return cached["path"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        pass
+    from webdriver_manager.chrome import ChromeDriverManager
+    driver_path = ChromeDriverManager().install()
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({"path": driver_path, "resolved_at": time.time()}, f)
+    return driver_path
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chrome headless. Cada navegador é iniciado no primeiro
+    uso, devolvido ao pool após cada página e reciclado depois de
+    `max_pages` páginas ou quando passa de `max_memory_mb`.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=MAX_PAGES_PER_BROWSER, max_memory_mb=MAX_BROWSER_MEMORY_MB):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.started = 0
+        self.recycled = 0
+        self._idle = []
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def _start_driver(self):
+        print("Iniciando o navegador Selenium em segundo plano...")
+        # Importados só aqui: a maioria das execuções nunca precisa do navegador.
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument(f'user-agent={USER_AGENT}')
+        options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+        self.started += 1
+        return {"driver": driver, "pages": 0}
+
+    def _memory_mb(self, entry):
+        if psutil is None:
+            return 0
+        try:
+            process = psutil.Process(entry["driver"].service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except (psutil.Error, AttributeError):
+            return 0
+
+    def _quit(self, entry):
+        try:
+            entry["driver"].quit()
+        except Exception as e:
+            print(f"   -> AVISO: erro ao fechar o navegador: {e}")
+
+    def acquire(self):
+        """Retorna um navegador livre, iniciando um novo se o pool ainda não estiver cheio."""
+        with self._condition:
+            while not self._idle and self._in_use >= self.size:
+                self._condition.wait()
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._start_driver()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, entry):
+        """Devolve o navegador ao pool, ou o encerra se atingiu o limite de páginas ou de memória."""
+        entry["pages"] += 1
+        recycle = entry["pages"] >= self.max_pages
+        if not recycle and self.max_memory_mb:
+            recycle = self._memory_mb(entry) > self.max_memory_mb
+        if recycle:
+            print(f"   -> Reciclando o navegador após {entry['pages']} páginas.")
+            self._quit(entry)
+            self.recycled += 1
+        with self._condition:
+            self._in_use -= 1
+            if not recycle:
+                self._idle.append(entry)
+            self._condition.notify()
+
+    def close(self):
+        """Encerra os navegadores ociosos."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        if idle:
+            print("\nFechando o navegador Selenium.")
+        for entry in idle:
+            self._quit(entry)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+_long_running = False
+
+def set_long_running(enabled=True):
+    """Marca o processo como de longa duração (serviço do agendador): o pool compartilhado passa a ser o padrão."""
+    global _long_running
+    _long_running = enabled
+
+def is_long_running():
+    return _long_running
+
+def get_shared_browser_pool(**pool_options):
+    """
+    Pool compartilhado entre execuções do mesmo processo (serviço do agendador,
+    `--service`), para que os navegadores continuem aquecidos. As execuções do
+    painel rodam em subprocessos e não se beneficiam dele. É encerrado quando o
+    processo termina.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool(**pool_options)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
+
+
+class SeleniumFetcher:
+    """Backend Selenium sobre um BrowserPool; o Chrome só é iniciado no primeiro uso."""
+
+    def __init__(self, pool=None, owns_pool=None):
+        self.pool = pool or BrowserPool()
+        # Um pool compartilhado continua vivo após a execução; um pool próprio é fechado junto.
+        self.owns_pool = pool is None if owns_pool is None else owns_pool
+
+    def fetch(self, url, ready_selector=None, timeout=0):
+        """
+        Carrega a página no navegador e retorna o HTML renderizado assim que
+        algum elemento de `ready_selector` aparece (ou após `timeout` segundos).
+        """
+        entry = self.pool.acquire()
+        try:
+            driver = entry["driver"]
+            started_at = time.monotonic()
+            driver.get(url)
+            if ready_selector and timeout:
+                from selenium.webdriver.common.by import By
+                from selenium.webdriver.support.ui import WebDriverWait
+                from selenium.common.exceptions import TimeoutException
+                try:
+                    WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+                        lambda d: d.find_elements(By.CSS_SELECTOR, ready_selector)
+                    )
+                    print(f"   -> Página pronta no navegador em {time.monotonic() - started_at:.1f}s.")
+                except TimeoutException:
+                    print(f"   -> AVISO: página não ficou pronta em {timeout}s: {url}")
+            return driver.page_source
+        finally:
+            self.pool.release(entry)
+
+    def close(self):
+        if self.owns_pool:
+            self.pool.close()
+
+
+class NitterFetcher:
+    """
+    Interface única de download para as páginas do Nitter.
+    Usa HTTP puro por padrão e recorre ao Selenium apenas quando a instância
+    responde com uma página de desafio JS.
+    """
+
+    def __init__(self, http_fetcher=None, browser_fetcher=None, host_limiter=None, browser_timeouts=None):
+        self.http = http_fetcher or HttpFetcher()
+        self.browser = browser_fetcher or SeleniumFetcher()
+        self.limiter = host_limiter or HostLimiter()
+        self.browser_timeouts = {**BROWSER_READY_TIMEOUTS, **(browser_timeouts or {})}
+        # Instâncias que já exigiram JS nesta execução vão direto para o navegador.
+        self.challenged_hosts = set()
+
+    def fetch(self, url, page_type="profile"):
+        """
+        Retorna o HTML da página. `page_type` ('profile' ou 'thread') define os
+        elementos e o tempo máximo de espera quando o Selenium é usado.
+        Erros de conexão são propagados ao chamador.
+        """
+        host = get_host(url)
+        self.limiter.acquire(host)
+        try:
+            if host not in self.challenged_hosts:
+                metrics.increment("pages_fetched", key=host)
+                with metrics.timer("fetch_http", histogram="fetch_http"):
+                    status_code, html_content = self.http.fetch(url)
+                if not is_challenge_page(html_content):
+                    if status_code >= 400:
+                        print(f"   -> AVISO: {host} respondeu com HTTP {status_code}.")
+                    return html_content
+                print(f"   -> Página de desafio JS detectada em {host}. Usando o Selenium como fallback.")
+                self.challenged_hosts.add(host)
+            metrics.increment("browser_pages_fetched", key=host)
+            with metrics.timer("fetch_browser", histogram="fetch_browser"):
+                return self.browser.fetch(url, READY_SELECTORS[page_type], self.browser_timeouts[page_type])
+        finally:
+            self.limiter.release(host)
+
+    def close(self):
+        self.http.close()
+        self.browser.close()
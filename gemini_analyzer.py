@@ -1,41 +1,42 @@
 import os
+import re
 import json
 import time
-import google.generativeai as genai
+import random
+import asyncio
+import threading
 from dotenv import load_dotenv
+from metrics import metrics
+from prompt_builder import estimate_tokens
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# --- CONFIGURAÇÃO DA API GEMINI (sem alterações) ---
-try:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("A variável de ambiente GEMINI_API_KEY não foi encontrada.")
-    genai.configure(api_key=api_key)
-except Exception as e:
-    print(f"Erro na configuração da API Gemini: {e}")
-    exit()
-
-# --- MODELO E CONFIGURAÇÕES DE GERAÇÃO (sem alterações) ---
+# --- MODELO E CONFIGURAÇÕES DE GERAÇÃO ---
 # Se e quando o modelo "gemini-2.5-flash" for lançado oficialmente, este nome estará correto.
 # Por agora, para testes, talvez precise usar 'gemini-1.5-flash-latest'.
-model = genai.GenerativeModel('gemini-2.5-flash')
+MODEL_NAME = 'gemini-2.5-flash'
 
-generation_config = {
-    "temperature": 0.0,
-    "response_mime_type": "application/json",
-    "response_schema": {
-        "type": "OBJECT",
-        "properties": {
-            "relevance": {
-                "type": "STRING",
-                "enum": ["yes", "no"] 
-            }
-        },
-        "required": ["relevance"]
-    },
-}
+_model_lock = threading.Lock()
+_model = None
+_model_api_key = None
+
+def get_model():
+    """
+    Retorna o modelo Gemini. O SDK só é importado e configurado no primeiro uso,
+    e o modelo é recriado quando a chave salva no .env muda.
+    """
+    global _model, _model_api_key
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("A variável de ambiente GEMINI_API_KEY não foi encontrada.")
+    with _model_lock:
+        if _model is None or api_key != _model_api_key:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(MODEL_NAME)
+            _model_api_key = api_key
+        return _model
 
 safety_settings = {
     'HATE': 'BLOCK_NONE',
@@ -44,50 +45,263 @@ safety_settings = {
     'DANGEROUS' : 'BLOCK_NONE'
 }
 
-def is_post_related(post_text, topic_prompt, project_context, max_retries=5):
+# --- CLASSIFICAÇÃO EM LOTE ---
+# Vários posts do mesmo perfil em uma única chamada: a descrição da tarefa e o
+# contexto do projeto são enviados uma vez só por lote.
+batch_generation_config = {
+    "temperature": 0.0,
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "post_id": {"type": "STRING"},
+                "relevance": {
+                    "type": "STRING",
+                    "enum": ["yes", "no"]
+                }
+            },
+            "required": ["post_id", "relevance"]
+        }
+    },
+}
+
+def build_prompt_prefix(topic_prompt, project_context):
     """
-    Usa a API do Gemini no modo JSON para verificar a relevância de um post,
-    usando um contexto específico do projeto.
+    Parte estática do prompt (tarefa + contexto do perfil), igual em todos os lotes
+    do perfil. Fica no início do prompt para que o cache implícito do Gemini possa
+    reaproveitá-la; os tokens vindos do cache aparecem em `_log_token_usage`.
     """
-    
-    full_prompt = f"""{topic_prompt}
+    return f"""{topic_prompt}
 
 --- CONTEXT ABOUT THE PROJECT AND MY FARMING STATUS ---
 {project_context}
 --- END OF CONTEXT ---
 
---- TASK: ANALYZE THE FOLLOWING POST and respond in the required JSON format ---
+"""
+
+def build_batch_task(posts):
+    """Parte variável do prompt de um lote; `posts` é uma lista de pares (post_id, texto)."""
+    posts_section = "\n\n".join(
+        f"=== POST post_id=\"{post_id}\" ===\n\"{post_text}\"\n=== END OF POST {post_id} ==="
+        for post_id, post_text in posts
+    )
+    return f"""--- TASK: ANALYZE EACH OF THE FOLLOWING {len(posts)} POSTS INDEPENDENTLY ---
+Respond with a JSON array containing exactly one object per post, with its "post_id" and its "relevance" ("yes" or "no").
 
-Post Text: \"{post_text}\"
+{posts_section}
 """
 
+def parse_batch_response(raw_answer, expected_ids):
+    """Retorna {post_id: bool} apenas para os posts com veredito válido na resposta."""
+    parsed_json = json.loads(raw_answer)
+    if not isinstance(parsed_json, list):
+        return {}
+    verdicts = {}
+    for item in parsed_json:
+        if not isinstance(item, dict):
+            continue
+        post_id = str(item.get("post_id", ""))
+        answer = item.get("relevance")
+        if post_id in expected_ids and post_id not in verdicts and answer in ("yes", "no"):
+            verdicts[post_id] = answer == "yes"
+    return verdicts
+
+# --- LIMITADOR E CLIENTE ASSÍNCRONO ---
+DEFAULT_RPM = 9
+DEFAULT_TPM = 250000
+DEFAULT_CONCURRENCY = 3
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 60
+QUOTA_COOLDOWN_SECONDS = 60
+
+class TokenBucketLimiter:
+    """
+    Token bucket compartilhado por todas as requisições em andamento, com um
+    balde em requisições por minuto (RPM) e outro em tokens por minuto (TPM).
+    Um erro de cota (429) pausa o balde inteiro até o fim do cooldown.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_tokens = float(rpm)
+        self.token_budget = float(tpm) if tpm else 0.0
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.total_wait = 0.0
+        self._lock = None
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.token_budget = min(self.tpm, self.token_budget + elapsed * self.tpm / 60)
+        self.updated_at = now
+
+    async def acquire(self, tokens=0):
+        """Aguarda até haver uma requisição e `tokens` disponíveis, e os consome."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        # O lock mantém a ordem de chegada: quem espera não é ultrapassado por requisições menores.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if self.request_tokens < 1:
+                    wait = max(wait, (1 - self.request_tokens) * 60 / self.rpm)
+                if self.tpm and self.token_budget < tokens:
+                    wait = max(wait, (tokens - self.token_budget) * 60 / self.tpm)
+                if wait <= 0:
+                    self.request_tokens -= 1
+                    self.token_budget -= tokens
+                    return
+                self.total_wait += wait
+                metrics.add_time("gemini_quota_wait", wait)
+                await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Corrige o balde de TPM com o consumo real informado pela API."""
+        if self.tpm and actual_tokens:
+            self.token_budget -= actual_tokens - estimated_tokens
+
+    def cooldown(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.request_tokens = 0.0
+
+def _log_token_usage(usage, estimated_tokens):
+    """Registra os tokens de cada requisição (entrada, parte vinda do cache e saída)."""
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    total_tokens = getattr(usage, "total_token_count", 0) or estimated_tokens
+    metrics.increment("llm_tokens", total_tokens)
+    metrics.increment("llm_prompt_tokens", prompt_tokens or estimated_tokens)
+    metrics.increment("llm_cached_tokens", cached_tokens)
+    metrics.increment("llm_output_tokens", output_tokens)
+    print(f"   > Tokens: {prompt_tokens or f'~{estimated_tokens}'} de entrada ({cached_tokens} do cache), "
+          f"{output_tokens} de saída, {total_tokens} no total.")
+
+def _quota_retry_delay(error):
+    """Extrai o 'retry_delay' sugerido pela API em um erro de cota, se houver."""
+    match = re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(error))
+    return int(match.group(1)) if match else None
+
+def _classify_error(error):
+    """Classifica um erro da API como 'quota' (429), 'transient' (5xx/timeout) ou 'fatal'."""
+    from google.api_core import exceptions as google_exceptions
+    if isinstance(error, google_exceptions.ResourceExhausted) or "429" in str(error):
+        return "quota"
+    if isinstance(error, (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                          google_exceptions.DeadlineExceeded, google_exceptions.TooManyRequests,
+                          ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return "transient"
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        return "fatal"
+    return "transient"
+
+def _backoff_delay(attempt):
+    """Backoff exponencial com jitter."""
+    ceiling = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)
+    return random.uniform(ceiling / 2, ceiling)
+
+async def classify_posts_batch_async(posts, topic_prompt, project_context, limiter, max_retries=5):
+    """
+    Classifica vários posts do mesmo perfil em uma única requisição.
+    `posts` é uma lista de pares (post_id, texto). Posts com veredito ausente
+    ou inválido são reenviados sozinhos nas tentativas seguintes.
+    Retorna {post_id: bool} só com os posts que receberam veredito; os demais
+    ficam de fora, para não serem gravados como "não relevante".
+    """
+    model = get_model()
+    pending = {str(post_id): post_text for post_id, post_text in posts}
+    verdicts = {}
+    prefix = build_prompt_prefix(topic_prompt, project_context)
+
     for attempt in range(max_retries):
-        print(f"   > Enviando para API Gemini (JSON Mode). Tentativa {attempt + 1}/{max_retries}...")
+        if not pending:
+            break
+        prompt = prefix + build_batch_task(list(pending.items()))
+        estimated_tokens = estimate_tokens(prompt)
+        await limiter.acquire(estimated_tokens)
+        print(f"   > Enviando lote de {len(pending)} posts para API Gemini (JSON Mode). Tentativa {attempt + 1}/{max_retries}...")
+        raw_answer = ""
+        metrics.increment("llm_calls")
+        if attempt:
+            metrics.increment("llm_retries")
         try:
-            response = model.generate_content(
-                full_prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings,
-            )
-            
+            with metrics.timer("gemini_requests", histogram="gemini_request"):
+                response = await model.generate_content_async(
+                    prompt,
+                    generation_config=batch_generation_config,
+                    safety_settings=safety_settings,
+                )
+            usage = getattr(response, "usage_metadata", None)
+            _log_token_usage(usage, estimated_tokens)
+            limiter.record_usage(estimated_tokens, getattr(usage, "total_token_count", 0))
             raw_answer = response.text.strip()
-            print(f"   > Resposta bruta do Gemini (JSON): '{raw_answer}'")
-            
-            parsed_json = json.loads(raw_answer)
-            answer = parsed_json.get("relevance")
-
-            if answer == 'yes':
-                return True
-            elif answer == 'no':
-                return False
-            else:
-                print(f"   > AVISO: Resposta JSON inválida ('{raw_answer}'). Tentando novamente...")
-
+            batch_verdicts = parse_batch_response(raw_answer, set(pending))
+            verdicts.update(batch_verdicts)
+            for post_id in batch_verdicts:
+                pending.pop(post_id)
+            if pending:
+                print(f"   > AVISO: {len(pending)} posts sem veredito válido no lote. Reenviando apenas esses...")
         except json.JSONDecodeError:
-            print(f"   > AVISO: Resposta não foi um JSON válido ('{raw_answer}'). Tentando novamente...")
+            print(f"   > AVISO: Resposta não foi um JSON válido ('{raw_answer[:200]}'). Tentando novamente...")
         except Exception as e:
-            print(f"   > !!! Erro ao contatar a API do Gemini: {e}. Tentando novamente em 5 segundos...")
-            time.sleep(5)
-            
-    print(f"   > !!! ERRO FINAL: Gemini não forneceu uma resposta válida após {max_retries} tentativas.")
-    return False
\ No newline at end of file
+            error_kind = _classify_error(e)
+            metrics.increment("llm_errors", key=error_kind)
+            if error_kind == "quota":
+                delay = _quota_retry_delay(e) or QUOTA_COOLDOWN_SECONDS
+                print(f"   > !!! Cota do Gemini esgotada (429). Pausando todas as requisições por {delay}s...")
+                limiter.cooldown(delay)
+            elif error_kind == "transient":
+                delay = _backoff_delay(attempt)
+                print(f"   > !!! Erro temporário na API do Gemini: {e}. Tentando novamente em {delay:.1f}s...")
+                metrics.add_time("gemini_backoff_wait", delay)
+                await asyncio.sleep(delay)
+            else:
+                print(f"   > !!! Erro não recuperável na API do Gemini: {e}. Lote abandonado.")
+                break
+
+    for post_id in pending:
+        print(f"   > !!! ERRO FINAL: Gemini não forneceu veredito válido para o post {post_id} após {max_retries} tentativas.")
+    return verdicts
+
+class AsyncClassifier:
+    """
+    Loop asyncio em uma thread própria, para que o pipeline envie lotes ao
+    Gemini e continue trabalhando enquanto as respostas não chegam. Todas as
+    requisições compartilham o mesmo limitador de RPM/TPM.
+    """
+
+    def __init__(self, topic_prompt, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, concurrency=DEFAULT_CONCURRENCY):
+        self.topic_prompt = topic_prompt
+        self.concurrency = max(1, concurrency)
+        self.limiter = TokenBucketLimiter(rpm=rpm, tpm=tpm)
+        self.requests = 0
+        self._semaphore = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="gemini-loop", daemon=True)
+        self.thread.start()
+
+    async def _run(self, posts, project_context):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            self.requests += 1
+            return await classify_posts_batch_async(posts, self.topic_prompt, project_context, self.limiter)
+
+    def submit(self, posts, project_context):
+        """Agenda um lote e retorna um concurrent.futures.Future com o {post_id: bool}."""
+        return asyncio.run_coroutine_threadsafe(self._run(posts, project_context), self.loop)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        if self.limiter.total_wait:
+            print(f"   > Tempo total aguardando o limitador de cota: {self.limiter.total_wait:.1f}s")
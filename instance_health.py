@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+
+# --- Constantes ---
+HEALTH_FILE = "instance_health.json"
+DEFAULT_NITTER_INSTANCES = [
+    "https://nitter.net", "https://nitter.tiekoetter.com",
+    "https://nitter.privacyredirect.com", "https://nuku.trabun.org",
+]
+EWMA_ALPHA = 0.3              # Peso da amostra mais recente na latência e na taxa de sucesso
+FAILURE_THRESHOLD = 3         # Falhas consecutivas para abrir o circuito
+OPEN_COOLDOWN_SECONDS = 900   # Tempo com o circuito aberto antes de uma requisição de teste (half-open)
+MAX_OPEN_COOLDOWN_SECONDS = 6 * 3600
+DEFAULT_LATENCY = 2.0         # Latência assumida para instâncias ainda sem histórico
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def _new_entry():
+    return {
+        "latency_ewma": None,
+        "success_rate": 1.0,
+        "successes": 0,
+        "failures": 0,
+        "consecutive_failures": 0,
+        "last_success": None,
+        "last_failure": None,
+        "circuit": STATE_CLOSED,
+        "opened_at": None,
+        "cooldown": OPEN_COOLDOWN_SECONDS,
+    }
+
+
+class InstanceHealth:
+    """
+    Tabela de saúde persistida das instâncias do Nitter, com circuit breaker.
+    Um circuito abre após FAILURE_THRESHOLD falhas seguidas; passado o cooldown,
+    uma única requisição de teste é liberada (half-open) para decidir se ele fecha.
+    """
+
+    def __init__(self, instances, path=HEALTH_FILE, routing="fastest"):
+        self.instances = list(instances)
+        self.path = path
+        self.routing = routing
+        self._lock = threading.Lock()
+        self._probing = set()
+        self._rotation = 0
+        self.table = self._load()
+        for instance in self.instances:
+            self.table.setdefault(instance, _new_entry())
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {url: {**_new_entry(), **entry} for url, entry in data.items()}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            data = {url: dict(entry) for url, entry in self.table.items()}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+
+    def _score(self, entry):
+        latency = entry["latency_ewma"] if entry["latency_ewma"] is not None else DEFAULT_LATENCY
+        return latency / max(entry["success_rate"], 0.05)
+
+    def _current_state(self, instance, entry, now):
+        if entry["circuit"] == STATE_OPEN and now - (entry["opened_at"] or 0) >= entry["cooldown"]:
+            return STATE_HALF_OPEN
+        return entry["circuit"]
+
+    def ordered_instances(self):
+        """
+        Retorna as instâncias disponíveis, da mais saudável para a menos saudável.
+        Instâncias com circuito aberto ficam de fora; as em half-open entram no
+        fim da lista, e apenas uma requisição de teste por vez é permitida.
+        """
+        now = time.time()
+        with self._lock:
+            healthy, probes = [], []
+            for instance in self.instances:
+                entry = self.table[instance]
+                state = self._current_state(instance, entry, now)
+                if state == STATE_CLOSED:
+                    healthy.append(instance)
+                elif state == STATE_HALF_OPEN and instance not in self._probing:
+                    probes.append(instance)
+            healthy.sort(key=lambda url: self._score(self.table[url]))
+            if self.routing == "spread" and len(healthy) > 1:
+                # Reveza entre as instâncias com pontuação até 2x a da melhor.
+                best = self._score(self.table[healthy[0]])
+                top = [url for url in healthy if self._score(self.table[url]) <= best * 2]
+                offset = self._rotation % len(top)
+                self._rotation += 1
+                healthy = top[offset:] + top[:offset] + healthy[len(top):]
+            return healthy + probes
+
+    def is_available(self, instance):
+        """Indica se uma requisição pode ser enviada agora, reservando a vaga de teste em half-open."""
+        now = time.time()
+        with self._lock:
+            entry = self.table.setdefault(instance, _new_entry())
+            state = self._current_state(instance, entry, now)
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and instance not in self._probing:
+                self._probing.add(instance)
+                print(f"-> Testando a instância {instance} (circuito half-open).")
+                return True
+            return False
+
+    def record_success(self, instance, latency):
+        with self._lock:
+            entry = self.table.setdefault(instance, _new_entry())
+            if entry["latency_ewma"] is None:
+                entry["latency_ewma"] = latency
+            else:
+                entry["latency_ewma"] = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * entry["latency_ewma"]
+            entry["success_rate"] = EWMA_ALPHA * 1.0 + (1 - EWMA_ALPHA) * entry["success_rate"]
+            entry["successes"] += 1
+            entry["consecutive_failures"] = 0
+            entry["last_success"] = time.time()
+            if entry["circuit"] != STATE_CLOSED:
+                print(f"-> Instância {instance} voltou a responder. Circuito fechado.")
+            entry["circuit"] = STATE_CLOSED
+            entry["opened_at"] = None
+            entry["cooldown"] = OPEN_COOLDOWN_SECONDS
+            self._probing.discard(instance)
+
+    def record_failure(self, instance):
+        now = time.time()
+        with self._lock:
+            entry = self.table.setdefault(instance, _new_entry())
+            entry["success_rate"] = (1 - EWMA_ALPHA) * entry["success_rate"]
+            entry["failures"] += 1
+            entry["consecutive_failures"] += 1
+            entry["last_failure"] = now
+            if instance in self._probing:
+                # Teste em half-open falhou: reabre com cooldown dobrado.
+                entry["circuit"] = STATE_OPEN
+                entry["opened_at"] = now
+                entry["cooldown"] = min(entry["cooldown"] * 2, MAX_OPEN_COOLDOWN_SECONDS)
+                self._probing.discard(instance)
+                print(f"-> Teste da instância {instance} falhou. Circuito reaberto por {entry['cooldown']}s.")
+            elif entry["circuit"] == STATE_CLOSED and entry["consecutive_failures"] >= FAILURE_THRESHOLD:
+                entry["circuit"] = STATE_OPEN
+                entry["opened_at"] = now
+                print(f"-> Instância {instance} falhou {entry['consecutive_failures']} vezes seguidas. Circuito aberto.")
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Constantes ---
+METRICS_HISTORY_FILE = "run_metrics.jsonl"
+# Limites superiores (em segundos) dos baldes dos histogramas de latência.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Histograma de latência com baldes fixos, soma, contagem e máximo."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = next((i for i, limit in enumerate(LATENCY_BUCKETS) if seconds <= limit), len(LATENCY_BUCKETS))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimativa do quantil pelo limite superior do balde onde ele cai."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(LATENCY_BUCKETS[index], self.max) if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "max": round(self.max, 4),
+            "buckets": dict(zip([str(limit) for limit in LATENCY_BUCKETS] + ["inf"], self.buckets)),
+        }
+
+
+class RunMetrics:
+    """
+    Métricas estruturadas de uma execução: contadores (com chave opcional,
+    ex.: páginas por instância), tempos acumulados por etapa e histogramas
+    de latência. Um registro por execução é anexado a run_metrics.jsonl.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.counters = {}
+            self.stage_seconds = {}
+            self.histograms = {}
+
+    def increment(self, name, amount=1, key=None):
+        with self._lock:
+            if key is None:
+                self.counters[name] = self.counters.get(name, 0) + amount
+            else:
+                keyed = self.counters.setdefault(name, {})
+                keyed[key] = keyed.get(key, 0) + amount
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, histogram=None):
+        """Soma a duração do bloco ao tempo da etapa e, opcionalmente, a um histograma."""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started_at
+            self.add_time(stage, elapsed)
+            if histogram:
+                self.observe(histogram, elapsed)
+
+    def snapshot(self, **extra):
+        with self._lock:
+            record = {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+                "counters": json.loads(json.dumps(self.counters)),
+                "latency": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            }
+        record.update(extra)
+        return record
+
+
+# Registro único do processo, usado pelos módulos de scraping, Gemini e Notion.
+metrics = RunMetrics()
+
+
+def append_metrics_history(record, path=METRICS_HISTORY_FILE):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_metrics_history(path=METRICS_HISTORY_FILE, limit=100):
+    """Retorna os últimos `limit` registros do histórico (linhas inválidas são ignoradas)."""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return []
+    return records[-limit:]
@@ -0,0 +1,135 @@
+import re
+import sys
+from datetime import datetime, timezone
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:  # O lxml está no requirements.txt; sem ele o parser nativo continua funcionando (só é mais lento).
+    HTML_PARSER = 'html.parser'
+
+# --- Constantes ---
+# Só as subárvores usadas pelos extratores são montadas; cabeçalho, menus e rodapé são ignorados.
+# O SoupStrainer compara o atributo class inteiro: a regex aceita classes compostas
+# ("timeline-item thread", "thread-last timeline-item"), como nas threads próprias do Nitter.
+# Os avisos de página vazia ("timeline-none", um <h2> no Nitter) e de erro ("error-panel") também são mantidos.
+PROFILE_STRAINER = SoupStrainer(['div', 'h2'], class_=re.compile(r'(^|\s)(timeline-item|timeline-none|error-panel)(\s|$)'))
+THREAD_STRAINER = SoupStrainer('div', class_=re.compile(r'(^|\s)(main-thread|error-panel)(\s|$)'))
+# Avisos do "error-panel" que indicam problema na instância (e não no perfil ou no post).
+INSTANCE_ERROR_MARKERS = ("rate limit", "try again later", "instance has been", "temporarily unavailable")
+
+MONTHS = {name: index for index, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+NITTER_DATE_RE = re.compile(r'^(\w{3}) (\d{1,2}), (\d{4}) · (\d{1,2}):(\d{2})(?: (AM|PM))? UTC$')
+
+
+def parse_profile_page(html_content):
+    """Monta apenas os itens da timeline de uma página de perfil (e o aviso de página vazia ou de erro)."""
+    return BeautifulSoup(html_content, HTML_PARSER, parse_only=PROFILE_STRAINER)
+
+
+def parse_thread_page(html_content):
+    """Monta apenas o bloco 'main-thread' (post anterior, post principal e continuações) ou o aviso de erro."""
+    return BeautifulSoup(html_content, HTML_PARSER, parse_only=THREAD_STRAINER)
+
+
+def page_notice(soup):
+    """
+    Texto do aviso do Nitter em uma página sem conteúdo: perfil sem posts
+    ("timeline-none") ou perfil/post inexistente, suspenso ou protegido
+    ("error-panel"). Retorna None se não houver aviso ou se o aviso for um
+    problema da própria instância (ex.: limite de requisições).
+    """
+    notice = soup.find(class_='timeline-none') or soup.find('div', class_='error-panel')
+    if not notice:
+        return None
+    text = notice.get_text(' ', strip=True)
+    if any(marker in text.lower() for marker in INSTANCE_ERROR_MARKERS):
+        return None
+    return text or "página vazia"
+
+
+def _parse_nitter_datetime_strptime(dt_string):
+    formats = ["%b %d, %Y · %I:%M %p %Z", "%b %d, %Y · %H:%M %Z"]
+    for fmt in formats:
+        try:
+            if "UTC" in dt_string:
+                dt_string_no_tz = dt_string.replace(" UTC", "").strip()
+                dt_obj = datetime.strptime(dt_string_no_tz, fmt.replace(" %Z", ""))
+                return dt_obj.replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    raise ValueError(f"Não foi possível analisar a data/hora: {dt_string}")
+
+
+def parse_nitter_datetime(dt_string):
+    """
+    Converte a data do Nitter ('Oct 16, 2026 · 2:15 PM UTC') em datetime UTC.
+    O formato usual é lido por uma regex pré-compilada; qualquer variação cai no strptime.
+    """
+    match = NITTER_DATE_RE.match(dt_string.strip())
+    if match and match.group(1) in MONTHS:
+        month_name, day, year, hour, minute, period = match.groups()
+        hour = int(hour)
+        if period:
+            if not 1 <= hour <= 12:
+                return _parse_nitter_datetime_strptime(dt_string)
+            hour = hour % 12 + (12 if period == "PM" else 0)
+        try:
+            return datetime(int(year), MONTHS[month_name], int(day), hour, int(minute), tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return _parse_nitter_datetime_strptime(dt_string)
+
+
+def _parse_date_or_none(parser, dt_string):
+    try:
+        return parser(dt_string)
+    except ValueError:
+        return None
+
+
+def check_parity(html_paths, base_url="https://nitter.example"):
+    """
+    Compara o caminho rápido (lxml + subárvores) com o parse completo pelo
+    'html.parser' sobre páginas HTML salvas. Retorna a lista de arquivos divergentes.
+    """
+    from scraper_logic import extract_initial_post_data, extract_full_thread_content
+    mismatches = []
+    for path in html_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        full_soup = BeautifulSoup(html_content, 'html.parser')
+        if full_soup.find('div', class_='main-thread'):
+            expected = extract_full_thread_content(full_soup, base_url)
+            actual = extract_full_thread_content(parse_thread_page(html_content), base_url)
+            before = full_soup.find('div', class_='before-tweet')
+            fast_before = parse_thread_page(html_content).find('div', class_='before-tweet')
+            expected = (expected, before.find('a')['href'] if before and before.find('a') else None)
+            actual = (actual, fast_before.find('a')['href'] if fast_before and fast_before.find('a') else None)
+        else:
+            expected = [extract_initial_post_data(item, base_url)
+                        for item in full_soup.find_all('div', class_='timeline-item')]
+            actual = [extract_initial_post_data(item, base_url)
+                      for item in parse_profile_page(html_content).find_all('div', class_='timeline-item')]
+            for date_link in full_soup.select('span.tweet-date a[title]'):
+                expected.append(_parse_date_or_none(_parse_nitter_datetime_strptime, date_link['title']))
+                actual.append(_parse_date_or_none(parse_nitter_datetime, date_link['title']))
+            # Páginas vazias ou de erro: o aviso precisa sobreviver ao filtro de subárvores.
+            expected.append(page_notice(full_soup))
+            actual.append(page_notice(parse_profile_page(html_content)))
+            if not expected[-1]:
+                expected.append(bool(full_soup.find('div', class_='error-panel')))
+                actual.append(bool(parse_thread_page(html_content).find('div', class_='error-panel')))
+        if expected != actual:
+            mismatches.append(path)
+            print(f"!!! Divergência em {path}")
+    print(f"Paridade verificada em {len(html_paths)} páginas ({HTML_PARSER}): {len(mismatches)} divergências.")
+    return mismatches
+
+
+if __name__ == "__main__":
+    # Uso: python nitter_parser.py pagina1.html pagina2.html ...
+    sys.exit(1 if check_parity(sys.argv[1:]) else 0)
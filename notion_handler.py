@@ -1,5 +1,10 @@
 import os
+import json
+import time
+import threading
+import httpx
 import notion_client
+from metrics import metrics
 from dotenv import load_dotenv
 from datetime import datetime
 import re
@@ -7,15 +12,77 @@ import re
 # Carrega as variáveis do arquivo .env
 load_dotenv()
 
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-NOTION_PAGE_ID = os.getenv("NOTION_PAGE_ID") 
+_client_lock = threading.Lock()
+_client = None
+_client_token = None
 
-# Verifica se as variáveis foram carregadas
-if not NOTION_TOKEN or not NOTION_PAGE_ID:
-    print("Erro fatal: NOTION_TOKEN ou NOTION_PAGE_ID não definidos no arquivo .env")
-    exit()
+def get_notion_client():
+    """
+    Retorna (cliente, page_id) do Notion. O cliente é criado no primeiro uso e
+    recriado quando o token salvo no .env muda.
+    """
+    global _client, _client_token
+    token = os.getenv("NOTION_TOKEN")
+    page_id = os.getenv("NOTION_PAGE_ID")
+    if not token or not page_id:
+        raise ValueError("NOTION_TOKEN ou NOTION_PAGE_ID não definidos no arquivo .env")
+    with _client_lock:
+        if _client is None or token != _client_token:
+            _client = notion_client.Client(auth=token)
+            _client_token = token
+        return _client, page_id
+
+# --- Limites da API do Notion ---
+NOTION_REQUESTS_PER_SECOND = 3
+MAX_BLOCKS_PER_REQUEST = 100
+MAX_PAYLOAD_BYTES = 450_000     # O limite da API é 500 KB por requisição; mantemos uma margem
+MAX_RATE_LIMIT_RETRIES = 3
+# Falhas de envio tratadas como entrega não concluída (o outbox tenta de novo depois): erros da API,
+# respostas 5xx sem JSON, timeouts do cliente e erros de transporte do httpx.
+NOTION_DELIVERY_ERRORS = (
+    notion_client.errors.HTTPResponseError,
+    notion_client.errors.RequestTimeoutError,
+    httpx.HTTPError,
+)
+
+class RequestRateLimiter:
+    """Espaça as requisições para respeitar o limite médio de requisições por segundo."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self.next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_slot)
+            self.next_slot = start_at + self.interval
+        if start_at > now:
+            metrics.add_time("notion_rate_limit_wait", start_at - now)
+            time.sleep(start_at - now)
 
-notion = notion_client.Client(auth=NOTION_TOKEN)
+notion_rate_limiter = RequestRateLimiter(NOTION_REQUESTS_PER_SECOND)
+
+def append_blocks(children):
+    """Anexa blocos à página respeitando o limitador; em 429 aguarda o Retry-After e tenta de novo."""
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        notion_rate_limiter.wait()
+        try:
+            notion, page_id = get_notion_client()
+            metrics.increment("notion_requests")
+            with metrics.timer("notion_requests", histogram="notion_request"):
+                return notion.blocks.children.append(block_id=page_id, children=children)
+        except NOTION_DELIVERY_ERRORS as e:
+            if getattr(e, "code", None) != "rate_limited" or attempt == MAX_RATE_LIMIT_RETRIES:
+                metrics.increment("notion_errors")
+                raise
+            headers = getattr(e, "headers", None) or {}
+            retry_after = float(headers.get("retry-after", 1))
+            print(f"  -> Limite de requisições do Notion atingido. Aguardando {retry_after:.1f}s...")
+            metrics.increment("notion_retries")
+            metrics.add_time("notion_rate_limit_wait", retry_after)
+            time.sleep(retry_after)
 
 # --- Função Auxiliar de Fatiamento (Chunking Function) ---
 def create_paragraph_blocks_from_text(text_content, chunk_size=2000):
@@ -86,6 +153,13 @@ def create_blocks_for_post(post_data):
             ]
         }}
     ]
+
+    # Quase-duplicatas agrupadas: lista os outros perfis que publicaram o mesmo conteúdo.
+    other_sources = [name for name in post_data.get('source_profiles', []) if name != username]
+    if other_sources:
+        blocks.append({"type": "paragraph", "paragraph": {"rich_text": [{"type": "text", "text": {
+            "content": "Também publicado por: " + ", ".join(f"@{name}" for name in other_sources)
+        }}]}})
     
     # Processa cada parte do conteúdo (texto e anexos)
     for part in content_parts:
@@ -113,23 +187,6 @@ def create_blocks_for_post(post_data):
     blocks.append({"type": "divider", "divider": {}})
     return blocks
 
-# --- Função de Envio para a API do Notion ---
-def append_post_to_page(post_data):
-    """Anexa os dados de um post ao final de uma página específica do Notion."""
-    # A verificação das variáveis de ambiente já foi feita no início.
-
-    blocks_to_add = create_blocks_for_post(post_data)
-
-    try:
-        print(f"  -> Anexando post de {post_data.get('username', 'N/A')} à página do Notion...")
-        notion.blocks.children.append(
-            block_id=NOTION_PAGE_ID,
-            children=blocks_to_add
-        )
-        print("  -> Sucesso! Blocos adicionados ao Notion.")
-    except notion_client.errors.APIResponseError as e:
-        print(f"!!! ERRO ao anexar blocos ao Notion: {e}")
-
 # --- Função de Envio de Notificação Simples ---
 def send_notification_to_notion(message_text, add_divider=True):
     print(f" N-> Enviando notificação para o Notion: '{message_text[:50]}...'")
@@ -151,10 +208,119 @@ def send_notification_to_notion(message_text, add_divider=True):
         notification_blocks.append({"type": "divider", "divider": {}})
 
     try:
-        notion.blocks.children.append(
-            block_id=NOTION_PAGE_ID,
-            children=notification_blocks
-        )
+        append_blocks(notification_blocks)
         print(" N-> Notificação enviada com sucesso ao Notion.")
-    except notion_client.errors.APIResponseError as e:
-        print(f"!!! ERRO ao enviar notificação ao Notion: {e}")
\ No newline at end of file
+        return True
+    except NOTION_DELIVERY_ERRORS as e:
+        print(f"!!! ERRO ao enviar notificação ao Notion: {e}")
+        return False
+
+# --- Escrita em Lote ---
+def _payload_size(blocks):
+    return len(json.dumps(blocks, ensure_ascii=False).encode('utf-8'))
+
+class NotionBatchWriter:
+    """
+    Agrupa os blocos de vários posts no menor número possível de chamadas
+    `blocks.children.append`, respeitando o limite de 100 blocos e o tamanho
+    máximo do payload por requisição. Os blocos de um post só são divididos
+    entre requisições quando o próprio post excede esses limites.
+    """
+
+    def __init__(self, max_blocks=MAX_BLOCKS_PER_REQUEST, max_payload_bytes=MAX_PAYLOAD_BYTES):
+        self.max_blocks = max_blocks
+        self.max_payload_bytes = max_payload_bytes
+        self.pending = []
+        self.requests_sent = 0
+
+    def add(self, post_data, parts_sent=0):
+        """`parts_sent` indica quantas partes de um post dividido já foram entregues numa tentativa anterior."""
+        self.pending.append((post_data, create_blocks_for_post(post_data), parts_sent))
+
+    def _split_post(self, blocks):
+        """Divide os blocos de um único post grande em pedaços que caibam numa requisição."""
+        chunks, current, current_size = [], [], 2
+        for block in blocks:
+            block_size = _payload_size([block])
+            if current and (len(current) >= self.max_blocks or current_size + block_size > self.max_payload_bytes):
+                chunks.append(current)
+                current, current_size = [], 2
+            current.append(block)
+            current_size += block_size + 1
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _pack_requests(self):
+        """
+        Retorna a lista de requisições como trios (posts incluídos, blocos, número da parte)
+        e a lista de posts divididos cujas partes já foram todas entregues antes.
+        O número da parte só existe nas requisições de um post dividido; as partes já
+        entregues numa tentativa anterior não são enviadas de novo.
+        """
+        requests, already_sent, current_posts, current_blocks, current_size = [], [], [], [], 2
+        for post_data, blocks, parts_sent in self.pending:
+            size = _payload_size(blocks)
+            if len(blocks) > self.max_blocks or size > self.max_payload_bytes:
+                if current_blocks:
+                    requests.append((current_posts, current_blocks, None))
+                    current_posts, current_blocks, current_size = [], [], 2
+                chunks = self._split_post(blocks)
+                if parts_sent >= len(chunks):
+                    already_sent.append(post_data)
+                for part_number, chunk in enumerate(chunks, start=1):
+                    if part_number > parts_sent:
+                        requests.append(([post_data], chunk, part_number))
+                continue
+            if current_blocks and (len(current_blocks) + len(blocks) > self.max_blocks or current_size + size > self.max_payload_bytes):
+                requests.append((current_posts, current_blocks, None))
+                current_posts, current_blocks, current_size = [], [], 2
+            current_posts.append(post_data)
+            current_blocks.extend(blocks)
+            current_size += size
+        if current_blocks:
+            requests.append((current_posts, current_blocks, None))
+        return requests, already_sent
+
+    def flush(self, on_result=None, on_part_sent=None):
+        """
+        Envia os posts pendentes e retorna uma lista de (post_data, sucesso),
+        na ordem em que foram adicionados. Se informado, `on_result(post_data, sucesso, erro)`
+        é chamado assim que a última requisição de cada post termina, e
+        `on_part_sent(post_data, número da parte)` a cada parte entregue de um post dividido,
+        para que uma nova tentativa continue da parte seguinte em vez de repetir as anteriores.
+        """
+        requests, already_sent = self._pack_requests()
+        print(f"  -> Enviando {len(self.pending)} posts ao Notion em {len(requests)} requisições...")
+        # Todas as partes chegaram ao Notion, mas a confirmação final não foi registrada (ex.: queda antes do on_result).
+        if on_result:
+            for post in already_sent:
+                on_result(post, True, None)
+        last_request = {}
+        for index, (posts_in_request, _, _) in enumerate(requests):
+            for post in posts_in_request:
+                last_request[id(post)] = index
+        failed_ids = set()
+        for index, (posts_in_request, blocks, part_number) in enumerate(requests):
+            if any(id(post) in failed_ids for post in posts_in_request):
+                # Parte anterior de um post dividido falhou: não envia o restante.
+                continue
+            try:
+                append_blocks(blocks)
+                self.requests_sent += 1
+            except NOTION_DELIVERY_ERRORS as e:
+                print(f"!!! ERRO ao anexar blocos ao Notion: {e}")
+                failed_ids.update(id(post) for post in posts_in_request)
+                if on_result:
+                    for post in posts_in_request:
+                        on_result(post, False, f"{type(e).__name__}: {e}")
+                continue
+            if part_number and on_part_sent:
+                on_part_sent(posts_in_request[0], part_number)
+            if on_result:
+                for post in posts_in_request:
+                    if last_request[id(post)] == index:
+                        on_result(post, True, None)
+        results = [(post_data, id(post_data) not in failed_ids) for post_data, _, _ in self.pending]
+        self.pending = []
+        return results
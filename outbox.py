@@ -0,0 +1,100 @@
+import time
+
+from notion_handler import NotionBatchWriter, send_notification_to_notion
+
+# --- Constantes ---
+MAX_DELIVERY_ATTEMPTS = 10
+BASE_RETRY_SECONDS = 60
+MAX_RETRY_SECONDS = 6 * 3600
+
+
+def _next_attempt_at(attempts):
+    """Backoff exponencial entre tentativas: 1 min, 2 min, 4 min... até 6 h."""
+    return time.time() + min(MAX_RETRY_SECONDS, BASE_RETRY_SECONDS * 2 ** attempts)
+
+
+def _with_source_profiles(store, post):
+    """Cópia do post com os perfis que publicaram a mesma thread (quase-duplicatas), lidos do índice no banco."""
+    sources = store.get_cluster_profiles(post['thread_id'])
+    if len(sources) > 1 and sources != post.get("source_profiles"):
+        return {**post, "source_profiles": sources}
+    return post
+
+
+def enqueue_post(store, post):
+    """Coloca um post relevante no outbox como pendente, antes de qualquer envio ao Notion."""
+    store.enqueue_delivery(post['thread_id'], post['username'], _with_source_profiles(store, post))
+
+
+def enqueue_notification(store, message_text):
+    store.enqueue_delivery(f"notification:{time.time():.6f}", "", {"message": message_text}, kind="notification")
+
+
+def _refresh_source_profiles(store, entry):
+    """
+    Atualiza no payload os perfis que publicaram a mesma thread (quase-duplicatas),
+    lidos do índice no banco: duplicatas extraídas depois do enfileiramento, ou em
+    outra execução, também entram. Um post dividido já parcialmente entregue mantém
+    a lista original, para que as partes restantes não mudem de fronteira.
+    """
+    post = entry["payload"]
+    if entry["parts_sent"]:
+        return post
+    refreshed = _with_source_profiles(store, post)
+    if refreshed is not post:
+        store.set_delivery_payload(entry["delivery_id"], refreshed)
+    return refreshed
+
+
+def deliver_pending(store):
+    """
+    Entrega tudo o que estiver pendente ou com nova tentativa vencida no outbox,
+    inclusive falhas de execuções anteriores. Retorna (entregues, falhas).
+    """
+    due = store.get_due_deliveries(time.time(), MAX_DELIVERY_ATTEMPTS)
+    if not due:
+        return 0, 0
+    retries = sum(1 for entry in due if entry["attempts"])
+    if retries:
+        print(f"  -> Outbox: {retries} entregas de execuções anteriores serão tentadas novamente.")
+
+    attempts_by_id = {entry["delivery_id"]: entry["attempts"] for entry in due}
+    counts = {"delivered": 0, "failed": 0}
+
+    def record(delivery_id, delivered, error=None):
+        if delivered:
+            store.mark_delivery(delivery_id, "delivered")
+            counts["delivered"] += 1
+        else:
+            store.mark_delivery(delivery_id, "failed", error=error or "Falha no envio ao Notion",
+                                next_attempt_at=_next_attempt_at(attempts_by_id[delivery_id]))
+            counts["failed"] += 1
+
+    writer = NotionBatchWriter()
+    for entry in due:
+        if entry["kind"] == "post":
+            writer.add(_refresh_source_profiles(store, entry), parts_sent=entry["parts_sent"])
+    if writer.pending:
+        # Cada post é marcado assim que sua requisição termina, para que uma queda no meio não gere reenvio;
+        # em posts divididos, cada parte entregue é registrada e a nova tentativa começa pela seguinte.
+        writer.flush(
+            on_result=lambda post, delivered, error: record(post['thread_id'], delivered, error),
+            on_part_sent=lambda post, part_number: store.set_delivery_parts_sent(post['thread_id'], part_number),
+        )
+
+    for entry in due:
+        if entry["kind"] == "notification":
+            record(entry["delivery_id"], send_notification_to_notion(entry["payload"]["message"]))
+
+    if counts["failed"]:
+        print(f"  -> Outbox: {counts['failed']} entregas falharam e serão tentadas novamente mais tarde.")
+    return counts["delivered"], counts["failed"]
+
+
+# --- Execução avulsa (ex.: tarefa agendada só para reenviar pendências) ---
+if __name__ == "__main__":
+    from storage import Store
+    store = Store()
+    delivered, failed = deliver_pending(store)
+    print(f"Outbox: {delivered} entregas concluídas, {failed} falhas.")
+    store.close()
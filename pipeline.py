@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+# --- Constantes ---
+DEFAULT_QUEUE_SIZE = 50
+
+_DONE = object()
+
+
+class Stage:
+    """
+    Etapa de um pipeline em streaming: `workers` threads consomem uma fila
+    limitada e publicam os resultados na fila da próxima etapa. Quando a fila
+    seguinte está cheia, `emit` bloqueia, e a pressão se propaga para trás.
+
+    `handler(item, emit)` processa um item e pode emitir zero ou mais resultados.
+    `on_idle(emit)` é chamado quando nenhum item chega por `idle_timeout`
+    segundos, e `on_close(emit)` uma vez, depois que a entrada se esgota;
+    ambos servem para etapas que acumulam itens em lotes.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=DEFAULT_QUEUE_SIZE,
+                 idle_timeout=None, on_idle=None, on_close=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.input = queue.Queue(maxsize=queue_size)
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self.on_close = on_close
+        self.next_stage = None
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def put(self, item):
+        self.input.put(item)
+
+    def emit(self, item):
+        if self.next_stage is not None:
+            self.next_stage.put(item)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.input.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._call_safely(self.on_idle, self.emit)
+                continue
+            if item is _DONE:
+                break
+            started_at = time.monotonic()
+            self._call_safely(self.handler, item, self.emit)
+            with self._lock:
+                self.processed += 1
+                self.busy_seconds += time.monotonic() - started_at
+
+    def _call_safely(self, function, *args):
+        if function is None:
+            return
+        try:
+            function(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"!!! Erro na etapa '{self.name}' do pipeline: {e}")
+
+    def close(self):
+        """Sinaliza o fim da entrada, espera os workers terminarem e executa `on_close`."""
+        for _ in self._threads:
+            self.input.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        self._call_safely(self.on_close, self.emit)
+
+
+def run_pipeline(stages, items, injected=None):
+    """
+    Conecta as etapas em sequência, alimenta a primeira com `items` e espera o
+    pipeline esvaziar. Cada etapa só é encerrada depois que a anterior terminou,
+    então nenhum item em trânsito se perde. `injected` é uma lista opcional de
+    pares (etapa, itens) que entram direto em uma etapa intermediária.
+    """
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next_stage = next_stage
+    for stage in stages:
+        stage.start()
+    for stage, stage_items in injected or []:
+        for item in stage_items:
+            stage.put(item)
+    for item in items:
+        stages[0].put(item)
+    for stage in stages:
+        stage.close()
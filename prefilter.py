@@ -0,0 +1,68 @@
+import re
+
+# --- Constantes ---
+# Regras usadas quando prefilter_rules.json não existe. As palavras-chave de
+# relevância são as mesmas que o prompt do Gemini já trata como "sempre 'yes'".
+DEFAULT_RULES = {
+    "relevant_keywords": ["claim", "snapshot", "TGE", "checker"],
+    "relevant_patterns": ["claim(s|ed|ing|able)", "snapshots", "checkers"],
+    "irrelevant_patterns": [],
+}
+
+VERDICT_RELEVANT = True
+VERDICT_IRRELEVANT = False
+
+
+def _compile_rules(rules):
+    keywords = [re.escape(keyword) for keyword in rules.get("relevant_keywords", [])]
+    relevant = keywords + list(rules.get("relevant_patterns", []))
+    return {
+        # Palavras-chave casam como palavra inteira, sem diferenciar maiúsculas.
+        "relevant": re.compile(r'\b(?:' + '|'.join(relevant) + r')\b', re.IGNORECASE) if relevant else None,
+        # Padrões de irrelevância precisam cobrir o texto inteiro: só decidem "não" quando não sobra nada além do ruído.
+        "irrelevant": [re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in rules.get("irrelevant_patterns", [])],
+    }
+
+
+class Prefilter:
+    """
+    Pré-filtro local que decide os casos triviais antes do Gemini.
+    As regras vêm de prefilter_rules.json: um bloco "default" e, em "profiles",
+    regras adicionais por perfil que são somadas às padrão.
+    """
+
+    def __init__(self, rules_config=None):
+        rules_config = rules_config or {}
+        self.default_rules = rules_config.get("default", DEFAULT_RULES)
+        self.profile_rules = rules_config.get("profiles", {})
+        self._compiled = {}
+        self.decided_relevant = 0
+        self.decided_irrelevant = 0
+        self.ambiguous = 0
+
+    def _rules_for(self, username):
+        if username not in self._compiled:
+            overrides = self.profile_rules.get(username, {})
+            merged = {
+                key: list(self.default_rules.get(key, [])) + list(overrides.get(key, []))
+                for key in ("relevant_keywords", "relevant_patterns", "irrelevant_patterns")
+            }
+            self._compiled[username] = _compile_rules(merged)
+        return self._compiled[username]
+
+    def decide(self, post_text, username):
+        """Retorna True (certamente relevante), False (certamente irrelevante) ou None (ambíguo, vai ao Gemini)."""
+        rules = self._rules_for(username)
+        if rules["relevant"] and rules["relevant"].search(post_text):
+            self.decided_relevant += 1
+            return VERDICT_RELEVANT
+        stripped_text = post_text.strip()
+        if any(pattern.fullmatch(stripped_text) for pattern in rules["irrelevant"]):
+            self.decided_irrelevant += 1
+            return VERDICT_IRRELEVANT
+        self.ambiguous += 1
+        return None
+
+    @property
+    def calls_saved(self):
+        return self.decided_relevant + self.decided_irrelevant
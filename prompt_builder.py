@@ -0,0 +1,60 @@
+import re
+
+# --- Constantes ---
+CHARS_PER_TOKEN = 4                 # Estimativa rápida: ~4 caracteres por token
+DEFAULT_MAX_POST_TOKENS = 2000      # Orçamento de tokens do texto de uma thread no prompt
+DEFAULT_TRIM_POLICY = "head_tail"
+TRIM_POLICIES = ("head_tail", "drop_media")
+HEAD_SHARE = 0.6                    # Fração do orçamento reservada ao início da thread (o resto fica para o fim)
+MEDIA_ONLY_MAX_CHARS = 30           # Partes com anexos e menos texto que isso (sem links) contam como só mídia
+PART_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text):
+    """Estimativa rápida (~4 caracteres por token) usada para reservar o TPM antes da chamada."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_media_only(part):
+    """Parte da thread que é essencialmente um anexo (foto/vídeo) com pouco ou nenhum texto."""
+    if not part.get('attachments'):
+        return False
+    text = re.sub(r'https?://\S+|pic\.\S+', '', part.get('text') or '')
+    return len(text.strip()) < MEDIA_ONLY_MAX_CHARS
+
+
+def _snap(text, index, forward):
+    """Move o corte até o espaço mais próximo, para não partir palavras ao meio."""
+    boundary = text.find(' ', index) if forward else text.rfind(' ', 0, index)
+    return index if boundary == -1 else boundary
+
+
+def trim_head_tail(text, max_tokens):
+    """Mantém o início e o fim do texto dentro do orçamento, marcando o trecho omitido."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    head_end = _snap(text, int(max_chars * HEAD_SHARE), forward=False)
+    tail_start = _snap(text, len(text) - (max_chars - head_end), forward=True)
+    omitted = tail_start - head_end
+    return f"{text[:head_end].rstrip()}\n\n[... {omitted} characters of the thread omitted ...]\n\n{text[tail_start:].lstrip()}"
+
+
+def compact_thread(parts, max_tokens=DEFAULT_MAX_POST_TOKENS, policy=DEFAULT_TRIM_POLICY):
+    """
+    Monta o texto da thread para o prompt respeitando o orçamento de tokens.
+    Threads dentro do orçamento ficam intactas. Com "drop_media", partes só de
+    mídia (exceto o post raiz) saem primeiro; em ambas as políticas o que ainda
+    exceder o orçamento é cortado no meio, mantendo início e fim.
+    Retorna (texto, tokens economizados).
+    """
+    parts = [part for part in parts if part.get('text')]
+    full_text = PART_SEPARATOR.join(part['text'] for part in parts)
+    if estimate_tokens(full_text) <= max_tokens:
+        return full_text, 0
+    if policy == "drop_media":
+        parts = parts[:1] + [part for part in parts[1:] if not is_media_only(part)]
+    text = trim_head_tail(PART_SEPARATOR.join(part['text'] for part in parts), max_tokens)
+    saved_tokens = estimate_tokens(full_text) - estimate_tokens(text)
+    # Com orçamentos muito pequenos o marcador de corte pode custar mais do que economiza.
+    return (text, saved_tokens) if saved_tokens > 0 else (full_text, 0)
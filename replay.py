@@ -0,0 +1,168 @@
+"""
+Modo replay: reclassifica threads já extraídas sem nenhum download.
+
+As threads vêm do banco local (padrão) ou de um extracted_x_posts.json e
+passam direto pelas etapas de classificação e entrega do pipeline, com os
+contextos atuais de profiles.json e o prompt atual. O cache de vereditos é
+indexado pelo hash do prompt e do contexto, então uma mudança em qualquer
+um dos dois já força a reclassificação. Em --dry-run o cache não é usado e
+os vereditos são gravados como simulação: não substituem o veredito atual
+da thread nem consomem a reclassificação pendente de um contexto editado.
+
+Com --changed-contexts, só os perfis cujo contexto foi editado desde a última
+reclassificação são revistos (posts dos últimos dias) e só os vereditos que
+mudaram de "não" para "sim" são entregues.
+
+Uso:
+    python replay.py --profiles NexusLabs,Lux --since 2026-10-01 --dry-run
+    python replay.py --source json --input extracted_x_posts.json
+    python replay.py --changed-contexts
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from metrics import metrics
+from pipeline import run_pipeline
+from scraper_logic import StreamingRun
+from gemini_analyzer import get_model
+from notion_handler import get_notion_client
+from storage import Store
+from thread_cache import extract_status_id
+from utils import load_config, load_profiles, get_profiles_pending_reclassification, mark_profiles_reclassified
+from verdict_cache import context_hash
+
+# --- Constantes ---
+DEFAULT_REPLAY_INPUT = "extracted_x_posts.json"
+DEFAULT_CONTEXT = "Nenhum contexto específico foi fornecido."
+RECLASSIFY_LOOKBACK_DAYS = 7    # Janela de posts revistos quando o contexto de um perfil muda
+
+
+def _end_of_day(value):
+    # Uma data sem horário em --until inclui o dia inteiro.
+    return f"{value}T23:59:59.999999+00:00" if value and len(value) == 10 else value
+
+
+def load_replay_posts(store, source="store", input_path=DEFAULT_REPLAY_INPUT, usernames=None, since=None, until=None):
+    """Carrega as threads a reprocessar, já filtradas por perfil e intervalo de datas (ISO)."""
+    until = _end_of_day(until)
+    if source == "store":
+        return store.get_threads(usernames, since, until)
+    with open(input_path, 'r', encoding='utf-8') as f:
+        posts = json.load(f)
+    selected = []
+    for post in posts:
+        if usernames and post.get("username") not in usernames:
+            continue
+        if since and (post.get("datetime") or "") < since:
+            continue
+        if until and (post.get("datetime") or "") > until:
+            continue
+        # Exportações antigas não tinham thread_id: o ID da raiz vem do link.
+        post.setdefault("thread_id", extract_status_id(post.get("link")))
+        if post["thread_id"] and post.get("content"):
+            selected.append(post)
+    return selected
+
+
+def replay(usernames=None, since=None, until=None, source="store", input_path=DEFAULT_REPLAY_INPUT,
+           dry_run=False, only_flipped=False, progress=None):
+    """
+    Reclassifica as threads selecionadas e, fora do dry-run, entrega ao Notion
+    as relevantes ainda não enviadas (com `only_flipped`, apenas as que eram
+    "não"). Retorna um resumo com as mudanças de veredito.
+    """
+    metrics.reset()
+    get_model()
+    if not dry_run:
+        get_notion_client()
+    config = load_config()
+    profiles = load_profiles()
+    store = Store()
+    try:
+        posts = load_replay_posts(store, source, input_path, usernames, since, until)
+        print(f"Replay: {len(posts)} threads selecionadas ({'dry-run, sem envio ao Notion' if dry_run else 'com entrega'}).")
+        if not posts:
+            return {"threads": 0, "relevant": 0, "flipped_to_yes": 0, "flipped_to_no": 0, "unclassified": 0}
+        previous_verdicts = {post["thread_id"]: store.get_latest_verdict(post["thread_id"]) for post in posts}
+
+        # Perfis sem entrada em profiles.json usam o contexto padrão.
+        known_profiles = {profile['name'] for profile in profiles}
+        profiles_with_posts = profiles + [{"name": username, "context": DEFAULT_CONTEXT}
+                                          for username in {post["username"] for post in posts} - known_profiles]
+        run = StreamingRun(profiles_with_posts, config, None, None, None, store, None, None, progress, dry_run=dry_run)
+        if only_flipped:
+            run.deliver_filter = lambda post: previous_verdicts.get(post["thread_id"]) is False
+        run.progress.set(stage="reclassificando", posts_extracted=len(posts))
+        run_pipeline(run.build_analysis_stages(deliver=not dry_run), posts)
+
+        relevant_ids = {post["thread_id"] for post in run.filtered_posts}
+        # Threads sem resposta do Gemini não mudaram de veredito: só não foram reavaliadas.
+        unclassified_ids = set(run.unclassified)
+        flipped_to_yes = [tid for tid, before in previous_verdicts.items() if before is False and tid in relevant_ids]
+        flipped_to_no = [tid for tid, before in previous_verdicts.items()
+                         if before is True and tid not in relevant_ids and tid not in unclassified_ids]
+        print(f"\nReplay concluído: {len(relevant_ids)} relevantes de {len(posts)}. "
+              f"Mudaram para 'sim': {len(flipped_to_yes)}; mudaram para 'não': {len(flipped_to_no)}; "
+              f"sem veredito: {len(unclassified_ids)}.")
+        for thread_id in flipped_to_yes:
+            print(f"   + {thread_id}")
+        for thread_id in flipped_to_no:
+            print(f"   - {thread_id}")
+        return {
+            "threads": len(posts),
+            "relevant": len(relevant_ids),
+            "flipped_to_yes": len(flipped_to_yes),
+            "flipped_to_no": len(flipped_to_no),
+            "unclassified": len(unclassified_ids),
+        }
+    finally:
+        store.close()
+
+
+def reclassify_changed_profiles(profiles=None, progress=None):
+    """
+    Reclassifica os posts recentes dos perfis com contexto editado desde a última
+    reclassificação e entrega só os que viraram "sim". Retorna quantos viraram "sim".
+    """
+    profiles = profiles if profiles is not None else load_profiles()
+    current_contexts = {p['name']: p['context'] for p in profiles}
+    pending = [name for name in get_profiles_pending_reclassification() if name in current_contexts]
+    if not pending:
+        print("Nenhum perfil com contexto alterado aguardando reclassificação.")
+        return 0
+    lookback_days = float(load_config().get("reclassify_lookback_days", RECLASSIFY_LOOKBACK_DAYS))
+    since = (datetime.now(timezone.utc) - timedelta(days=lookback_days)).isoformat()
+    print(f"Contexto alterado em {len(pending)} perfis ({', '.join(pending)}). Reclassificando posts dos últimos {lookback_days:g} dias.")
+    summary = replay(pending, since=since, only_flipped=True, progress=progress)
+    # Com threads sem resposta do Gemini, os perfis continuam pendentes e a reclassificação é refeita depois.
+    if summary["unclassified"]:
+        print(f"-> {summary['unclassified']} threads ficaram sem veredito. A reclassificação continua pendente.")
+    else:
+        mark_profiles_reclassified({name: context_hash(current_contexts[name]) for name in pending})
+    return summary["flipped_to_yes"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reclassifica threads já extraídas, sem novo scraping.")
+    parser.add_argument("--source", choices=["store", "json"], default="store", help="Banco local (padrão) ou arquivo JSON exportado.")
+    parser.add_argument("--input", default=DEFAULT_REPLAY_INPUT, help="Arquivo JSON usado com --source json.")
+    parser.add_argument("--profiles", help="Perfis separados por vírgula (padrão: todos).")
+    parser.add_argument("--since", help="Data/hora ISO mínima do post (ex.: 2026-10-01).")
+    parser.add_argument("--until", help="Data/hora ISO máxima do post (uma data sem horário inclui o dia inteiro).")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Não envia nada ao Notion nem usa o cache; os vereditos ficam marcados como simulação.")
+    parser.add_argument("--changed-contexts", action="store_true",
+                        help="Reclassifica só os perfis com contexto editado e entrega só os vereditos que viraram 'sim'.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.changed_contexts:
+        reclassify_changed_profiles()
+        sys.exit(0)
+    usernames = [name.strip() for name in args.profiles.split(",")] if args.profiles else None
+    replay(usernames, args.since, args.until, args.source, args.input, args.dry_run)
+    sys.exit(0)
@@ -0,0 +1,143 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# --- Constantes ---
+PROGRESS_FILE = "run_progress.json"
+HEARTBEAT_SECONDS = 2           # Intervalo de gravação do progresso durante a execução
+STALE_AFTER_SECONDS = 60        # Sem atualização por esse tempo, a execução é considerada interrompida
+MAX_TAIL_BYTES = 200_000        # Limite de log lido de uma vez (o início de logs grandes é ignorado)
+
+
+class RunProgress:
+    """
+    Progresso estruturado de uma execução, gravado em run_progress.json por uma
+    thread de heartbeat. Os contadores são atualizados em memória pelas etapas
+    do pipeline e o painel lê o arquivo sem depender do log.
+    """
+
+    def __init__(self, run_id=None, run_type="manual", path=PROGRESS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.data = {
+            "run_id": run_id or new_run_id(),
+            "run_type": run_type,
+            "status": "running",
+            "pid": os.getpid(),
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "updated_at": time.time(),
+            "stage": "iniciando",
+            "profiles_total": 0,
+            "profiles_done": 0,
+            "posts_discovered": 0,
+            "posts_extracted": 0,
+            "posts_classified": 0,
+            "posts_relevant": 0,
+            "deliveries_pending": 0,
+            "error": None,
+        }
+        self._thread = None
+
+    @property
+    def run_id(self):
+        return self.data["run_id"]
+
+    def start(self):
+        self.save()
+        self._thread = threading.Thread(target=self._heartbeat, name="run-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            self.save()
+
+    def set(self, **fields):
+        with self._lock:
+            self.data.update(fields)
+
+    def increment(self, field, amount=1):
+        with self._lock:
+            self.data[field] += amount
+
+    def save(self):
+        with self._lock:
+            self.data["updated_at"] = time.time()
+            snapshot = dict(self.data)
+        # Gravação atômica: o painel nunca lê um arquivo pela metade.
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def finish(self, error=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.set(status="failed" if error else "finished", error=str(error) if error else None,
+                 finished_at=datetime.now().isoformat(), stage="concluída")
+        self.save()
+
+
+def new_run_id():
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def load_progress(path=PROGRESS_FILE):
+    """Lê o progresso da última execução, marcando como 'interrupted' uma execução sem heartbeat recente."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if progress.get("status") == "running" and time.time() - progress.get("updated_at", 0) > STALE_AFTER_SECONDS:
+        progress["status"] = "interrupted"
+    return progress
+
+
+def is_run_active(path=PROGRESS_FILE):
+    progress = load_progress(path)
+    return bool(progress) and progress["status"] == "running"
+
+
+def start_background_run(run_type="manual"):
+    """
+    Inicia a análise em um processo separado e retorna o ID da execução. O
+    processo continua mesmo se a aba do painel for fechada ou recarregada.
+    """
+    run_id = new_run_id()
+    # Marca a execução como iniciada antes do processo subir, para que o painel não permita um segundo clique.
+    RunProgress(run_id, run_type).save()
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper_logic.py")
+    creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+    subprocess.Popen(
+        [sys.executable, script_path, "--run-id", run_id, "--run-type", run_type],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+        creationflags=creationflags, start_new_session=os.name != "nt",
+    )
+    return run_id
+
+
+def tail_log(log_path, offset=0):
+    """Retorna (texto novo, novo offset) do log a partir de `offset`; recomeça se o arquivo foi recriado."""
+    try:
+        size = os.path.getsize(log_path)
+    except OSError:
+        return "", 0
+    if size < offset:
+        offset = 0
+    if size - offset > MAX_TAIL_BYTES:
+        offset = size - MAX_TAIL_BYTES
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    # Só devolve linhas completas: uma linha (ou caractere UTF-8) pela metade fica para a próxima leitura.
+    chunk = chunk[:chunk.rfind(b"\n") + 1]
+    return chunk.decode('utf-8', errors='replace'), offset + len(chunk)
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+
+# --- Constantes ---
+STATE_FILE = "run_state.json"
+NEW_PROFILE_LOOKBACK_DAYS = 1   # Janela de busca para perfis ainda sem cursor
+SEEN_MAX_ENTRIES = 20000        # Tamanho máximo do índice de status já vistos
+SEEN_MAX_AGE_DAYS = 14          # Status vistos há mais tempo que isso são esquecidos
+
+
+class RunState:
+    """
+    Estado incremental persistido em run_state.json: um cursor por perfil
+    (ID e data do post mais novo já tratado) e um índice compacto de status
+    já vistos, consultado antes de qualquer download de thread.
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.profiles = {}
+        self.seen = {}
+        self.legacy_timestamp = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state_data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            print("Arquivo de estado não encontrado ou inválido. Perfis sem cursor começam pelas últimas 24 horas.")
+            return
+        self.profiles = state_data.get("profiles", {})
+        self.seen = state_data.get("seen_ids", {})
+        # Estado antigo (timestamp global único): vale como cursor de todos os perfis na migração.
+        if "profiles" not in state_data and state_data.get("latest_post_timestamp"):
+            self.legacy_timestamp = datetime.fromisoformat(state_data["latest_post_timestamp"])
+            print(f"Estado antigo encontrado. Perfis sem cursor começam a partir de: {self.legacy_timestamp}")
+
+    def _evict(self, now):
+        min_seen_at = now - SEEN_MAX_AGE_DAYS * 86400
+        self.seen = {sid: seen_at for sid, seen_at in self.seen.items() if seen_at >= min_seen_at}
+        if len(self.seen) > SEEN_MAX_ENTRIES:
+            newest = sorted(self.seen.items(), key=lambda item: item[1], reverse=True)[:SEEN_MAX_ENTRIES]
+            self.seen = dict(newest)
+
+    def save(self):
+        with self._lock:
+            self._evict(time.time())
+            state_data = {"profiles": self.profiles, "seen_ids": self.seen}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(state_data, f, indent=4)
+        print(f"Estado salvo: {len(self.profiles)} cursores de perfil, {len(self.seen)} status no índice de vistos.")
+
+    def cursor_for(self, username, lookback_days=NEW_PROFILE_LOOKBACK_DAYS):
+        """Retorna (data mínima, ID mínimo ou None) para buscar posts novos de um perfil."""
+        with self._lock:
+            cursor = self.profiles.get(username)
+        if cursor:
+            return datetime.fromisoformat(cursor["newest_datetime"]), cursor.get("newest_status_id")
+        if self.legacy_timestamp:
+            return self.legacy_timestamp, None
+        return datetime.now(timezone.utc) - timedelta(days=lookback_days), None
+
+    def is_seen(self, status_id):
+        with self._lock:
+            return status_id in self.seen
+
+    def mark_seen(self, status_ids):
+        now = time.time()
+        with self._lock:
+            for status_id in status_ids:
+                if status_id:
+                    self.seen[status_id] = now
+
+    def advance_cursors(self, discovered_posts):
+        """
+        Avança o cursor de cada perfil até o post mais novo tal que todos os
+        posts descobertos até ele já estejam no índice de vistos. Assim, um post
+        cuja thread falhou em baixar é buscado de novo na próxima execução.
+        """
+        by_profile = {}
+        for post in discovered_posts:
+            by_profile.setdefault(post["username"], []).append(post)
+        with self._lock:
+            for username, posts in by_profile.items():
+                posts.sort(key=lambda post: int(post["status_id"]))
+                newest_handled = None
+                for post in posts:
+                    if post["status_id"] not in self.seen:
+                        break
+                    newest_handled = post
+                if newest_handled:
+                    self.profiles[username] = {
+                        "newest_status_id": newest_handled["status_id"],
+                        "newest_datetime": newest_handled["datetime"],
+                    }
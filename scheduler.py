@@ -0,0 +1,175 @@
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from prefilter import Prefilter
+from run_progress import is_run_active
+from run_state import NEW_PROFILE_LOOKBACK_DAYS
+from storage import Store
+from utils import load_config, load_profiles, load_prefilter_rules, get_profiles_pending_reclassification, ENV_FILE
+
+# --- Constantes ---
+SCHEDULE_FILE = "schedule_state.json"
+MIN_POLL_INTERVAL_MINUTES = 15      # Perfis muito ativos nunca são consultados mais que isso
+MAX_POLL_INTERVAL_MINUTES = 720     # Perfis quietos são consultados ao menos a cada 12 horas
+URGENT_POLL_INTERVAL_MINUTES = 5    # Intervalo enquanto o perfil está em modo urgente
+URGENT_DURATION_HOURS = 6           # Duração do modo urgente após um post de alta relevância
+POSTS_PER_POLL = 1.0                # Meta de posts novos por consulta: intervalo = meta / taxa
+RATE_SMOOTHING = 0.3                # Peso da observação mais recente na média móvel da taxa
+POLL_JITTER = 0.2                   # Variação aleatória de ±20% no intervalo
+MAX_PROFILES_PER_RUN = 10           # Orçamento global de perfis por rodada
+FAILURE_RETRY_MINUTES = 5           # Espera após uma rodada que falhou; dobra a cada falha seguida, até o intervalo máximo
+TICK_SECONDS = 30
+
+
+class PollingScheduler:
+    """
+    Agendador adaptativo por perfil. Mantém em schedule_state.json a taxa de
+    posts por hora (média móvel) de cada perfil e calcula o próximo horário de
+    consulta a partir dela: perfis ativos são consultados com mais frequência,
+    perfis quietos com menos. Um post que bate nas palavras-chave de alta
+    relevância coloca o perfil em modo urgente por algumas horas.
+    """
+
+    def __init__(self, config=None, path=SCHEDULE_FILE):
+        config = config if config is not None else load_config()
+        self.path = path
+        self.min_interval = float(config.get("scheduler_min_interval_minutes", MIN_POLL_INTERVAL_MINUTES)) * 60
+        self.max_interval = float(config.get("scheduler_max_interval_minutes", MAX_POLL_INTERVAL_MINUTES)) * 60
+        self.urgent_interval = float(config.get("scheduler_urgent_interval_minutes", URGENT_POLL_INTERVAL_MINUTES)) * 60
+        self.urgent_duration = float(config.get("scheduler_urgent_duration_hours", URGENT_DURATION_HOURS)) * 3600
+        self.jitter = float(config.get("scheduler_jitter", POLL_JITTER))
+        self.max_profiles_per_run = int(config.get("scheduler_max_profiles_per_run", MAX_PROFILES_PER_RUN))
+        # Na primeira consulta de um perfil, os posts novos cobrem a janela de busca de perfis sem cursor.
+        self.lookback_hours = float(config.get("new_profile_lookback_days", NEW_PROFILE_LOOKBACK_DAYS)) * 24
+        self.prefilter = Prefilter(load_prefilter_rules())
+        self.profiles = self._load()
+        # Falhas seguidas da reclassificação pendente (só em memória) e o horário da próxima tentativa.
+        self.reclassify_failures = 0
+        self.reclassify_retry_at = 0
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("profiles", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"profiles": self.profiles}, f, indent=4)
+
+    def _interval_for(self, entry, now):
+        if entry.get("urgent_until", 0) > now:
+            interval = self.urgent_interval
+        elif entry.get("posts_per_hour"):
+            interval = min(self.max_interval, max(self.min_interval, POSTS_PER_POLL / entry["posts_per_hour"] * 3600))
+        else:
+            interval = self.max_interval
+        # O jitter evita que todos os perfis sejam consultados no mesmo instante, sempre no mesmo padrão.
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def due_profiles(self, profiles, now=None):
+        """Retorna os perfis cujo horário de consulta já passou, dos mais atrasados aos menos, até o orçamento."""
+        now = now or time.time()
+        # Perfis novos (sem histórico) entram na primeira rodada.
+        due = [p for p in profiles if self.profiles.get(p['name'], {}).get("next_poll_at", 0) <= now]
+        due.sort(key=lambda p: self.profiles.get(p['name'], {}).get("next_poll_at", 0))
+        return due[:self.max_profiles_per_run]
+
+    def record_poll(self, username, new_posts, polled_at, urgent=False):
+        """Atualiza a taxa de posts do perfil e agenda a próxima consulta."""
+        entry = self.profiles.setdefault(username, {})
+        last_polled_at = entry.get("last_polled_at")
+        # Sem consulta anterior, a taxa inicial vem dos posts encontrados na janela de busca,
+        # para que perfis ativos não esperem o intervalo máximo até a segunda consulta.
+        hours = max((polled_at - last_polled_at) / 3600, 1 / 60) if last_polled_at else self.lookback_hours
+        observed_rate = len(new_posts) / hours
+        previous_rate = entry.get("posts_per_hour")
+        entry["posts_per_hour"] = observed_rate if previous_rate is None else (
+            RATE_SMOOTHING * observed_rate + (1 - RATE_SMOOTHING) * previous_rate)
+        if urgent:
+            entry["urgent_until"] = polled_at + self.urgent_duration
+            print(f"   -> Post de alta relevância em '{username}'. Modo urgente por {self.urgent_duration / 3600:.0f}h.")
+        entry["last_polled_at"] = polled_at
+        entry["next_poll_at"] = polled_at + self._interval_for(entry, polled_at)
+        entry.pop("failures", None)
+
+    def _failure_delay(self, failures):
+        return min(self.max_interval, FAILURE_RETRY_MINUTES * 60 * 2 ** (failures - 1))
+
+    def record_failure(self, username, failed_at):
+        """Adia o perfil após uma rodada que falhou (ex.: chave de API ausente), com espera crescente."""
+        entry = self.profiles.setdefault(username, {})
+        entry["failures"] = entry.get("failures", 0) + 1
+        entry["next_poll_at"] = failed_at + self._failure_delay(entry["failures"])
+
+    def is_urgent(self, post):
+        full_text = "\n".join(part['text'] for part in post.get('content', []) if part.get('text'))
+        return self.prefilter.decide(full_text, post['username']) is True
+
+    def run_once(self, now=None):
+        """Executa uma rodada com os perfis vencidos. Retorna quantos perfis foram consultados."""
+        from scraper_logic import run_with_logging_and_state
+        now = now or time.time()
+        # Chaves salvas pelo painel chegam ao serviço sem reiniciá-lo; os clientes são recriados quando a chave muda.
+        load_dotenv(ENV_FILE, override=True)
+        profiles = load_profiles()
+        due = self.due_profiles(profiles, now)
+        pending_reclassification = get_profiles_pending_reclassification() if now >= self.reclassify_retry_at else []
+        if not due and not pending_reclassification:
+            return 0
+        if is_run_active():
+            print("   -> Há uma execução em andamento (manual ou agendada). Rodada adiada.")
+            return 0
+        # Contextos editados enquanto outra execução rodava são reclassificados antes da rodada.
+        if pending_reclassification:
+            try:
+                run_with_logging_and_state(profiles, run_type="reclassify")
+                self.reclassify_failures = 0
+            except Exception:
+                self.reclassify_failures += 1
+                self.reclassify_retry_at = now + self._failure_delay(self.reclassify_failures)
+                raise
+        if not due:
+            return 0
+        print(f"[{datetime.now():%d/%m %H:%M}] Consultando {len(due)} perfis: {', '.join(p['name'] for p in due)}")
+        run_started_at = datetime.now(timezone.utc).isoformat()
+        try:
+            run_with_logging_and_state(due, run_type="scheduled")
+        except Exception:
+            # Sem isso, os mesmos perfis vencidos voltariam a cada tick, sobrescrevendo o log a cada 30 s.
+            for profile in due:
+                self.record_failure(profile['name'], now)
+            self.save()
+            raise
+        store = Store()
+        try:
+            for profile in due:
+                # Threads extraídas nesta rodada = posts novos desde a consulta anterior.
+                new_posts = store.get_threads([profile['name']], extracted_since=run_started_at)
+                urgent = any(self.is_urgent(post) for post in new_posts)
+                self.record_poll(profile['name'], new_posts, now, urgent)
+        finally:
+            store.close()
+        self.save()
+        return len(due)
+
+    def run_forever(self):
+        from fetcher import set_long_running
+        print("Agendador adaptativo iniciado. Pressione Ctrl+C para encerrar.")
+        # Processo de longa duração: o pool de navegadores é reaproveitado entre as rodadas.
+        set_long_running()
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"!!! Erro na rodada agendada: {e}")
+            time.sleep(TICK_SECONDS)
+
+
+if __name__ == "__main__":
+    PollingScheduler().run_forever()
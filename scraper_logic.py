@@ -1,63 +1,69 @@
 import json
-import random
-import re
+import sys
+import threading
 import time
-from datetime import datetime, timezone, timedelta
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
 from contextlib import redirect_stdout
 
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from gemini_analyzer import is_post_related
-from notion_handler import append_post_to_page, send_notification_to_notion
-from utils import load_config, save_config, LOG_FILE, load_profiles
+from nitter_parser import parse_profile_page, parse_thread_page, parse_nitter_datetime, page_notice
+from fetcher import (
+    NitterFetcher, SeleniumFetcher, HostLimiter, BrowserPool, get_shared_browser_pool, is_long_running,
+    MAX_REQUESTS_PER_INSTANCE, MIN_REQUEST_INTERVAL, BROWSER_POOL_SIZE, MAX_PAGES_PER_BROWSER, MAX_BROWSER_MEMORY_MB,
+    BROWSER_READY_TIMEOUTS,
+)
+from instance_health import InstanceHealth, DEFAULT_NITTER_INSTANCES
+from thread_cache import ThreadCache, CONTENT_TTL_HOURS, extract_status_id
+from run_state import RunState, NEW_PROFILE_LOOKBACK_DAYS
+from storage import Store
+from verdict_cache import VerdictCache
+from prefilter import Prefilter
+from dedup import NearDuplicateIndex
+from outbox import enqueue_post, enqueue_notification, deliver_pending
+from notion_handler import get_notion_client
+from pipeline import Stage, run_pipeline, DEFAULT_QUEUE_SIZE
+from gemini_analyzer import (
+    AsyncClassifier, get_model, DEFAULT_RPM, DEFAULT_TPM, DEFAULT_CONCURRENCY
+)
+from prompt_builder import compact_thread, DEFAULT_MAX_POST_TOKENS, DEFAULT_TRIM_POLICY
+from run_progress import RunProgress
+from metrics import metrics, append_metrics_history
+from utils import load_config, save_config, LOG_FILE, load_profiles, load_prefilter_rules
 
 # --- Constantes ---
-STATE_FILE = "run_state.json"
+DEFAULT_SCRAPE_WORKERS = 4
+DEFAULT_GEMINI_BATCH_SIZE = 8
+DEFAULT_BATCH_LINGER_SECONDS = 10
+DEFAULT_DELIVER_BATCH_SIZE = 10
+DEFAULT_DELIVER_LINGER_SECONDS = 2
+UNCLASSIFIED_RETRY_DAYS = 3     # Threads sem veredito (falha do Gemini) voltam à classificação por esse período
 
-# --- Funções de Estado (sem alterações) ---
-def load_last_run_timestamp():
-    """Carrega o timestamp da última execução."""
-    try:
-        with open(STATE_FILE, 'r', encoding='utf-8') as f:
-            state_data = json.load(f)
-            last_timestamp_str = state_data.get("latest_post_timestamp")
-            if last_timestamp_str:
-                print(f"Estado anterior encontrado. Iniciando a partir de: {last_timestamp_str}")
-                return datetime.fromisoformat(last_timestamp_str)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("Arquivo de estado não encontrado ou inválido. Iniciando a partir das últimas 24 horas.")
-    return datetime.now(timezone.utc) - timedelta(days=1)
-
-def save_latest_timestamp(posts):
-    """Salva o timestamp mais recente no arquivo de estado."""
-    if not posts:
-        print("Nenhum post novo encontrado. O arquivo de estado não será atualizado.")
-        return
-    latest_post = max(posts, key=lambda post: datetime.fromisoformat(post['datetime']))
-    latest_timestamp = latest_post['datetime']
-    state_data = {"latest_post_timestamp": latest_timestamp}
-    with open(STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state_data, f, indent=4)
-    print(f"Estado salvo. A próxima execução começará a partir de: {latest_timestamp}")
+# --- Instruções do Gemini ---
+TASK_DESCRIPTION = """
+        **1. Your Role and Objective:**
+        You are a specialized AI assistant for an expert airdrop hunter. Your only task is to act as a personalized filter. In each request, you will receive my current "Project & Farming Status" and a "Social Media Post" from that project. Your goal is to determine if the post is relevant **TO ME**, based on my status. If there is no project context and/or my airdrop farming status, consider any relevant signal related to the "Airdrop" theme as a "yes" answer.
+
+        **2. The Core Question:**
+        "Does this post contain new, actionable information for my specific farming strategy, OR does it announce critical, universal airdrop logistics?"
+
+        **3. High-Relevance Triggers (Always answer 'yes'):**
+        - **Universal Airdrop Logistics:** The post mentions critical, general information like: a "claim" process, a wallet "checker", official "snapshot" dates, "TGE" (Token Generation Event), token "listing" dates, or new, universal "eligibility" tasks that apply to everyone.
+        - **Strategy-Specific News:** The post announces updates, new tasks, or information **directly related** to the specific network, platform, or campaign mentioned in my "Project & Farming Status".
+
+        **4. Irrelevance Triggers (Always answer 'no'):**
+        - **Different Strategy Announcements:** This is a critical filter. If the post announces a new campaign, integration, or opportunity on a **different network or platform** than the one specified in my "Farming Status", it is considered noise and is NOT relevant.
+        - **General Noise:** General market discussions, price speculation, standard technical updates without direct user rewards, or generic community engagement posts ("GM", "happy Monday").
+
+        **5. Example Logic to Follow:**
+        - If my status is "Farming on Bob Network" and the post says "We are now live on Solana!", your answer is 'no'.
+        - If my status is "Farming on Bob Network" and the post says "New quest for all Bob Network users!", your answer is 'yes'.
+        - If my status is "I have 100,000 Lux points" and the post says "The snapshot for Lux points has been taken", your answer is 'yes'.
+        """
 
 # --- Funções de Scraping e Extração (sem alterações na lógica interna) ---
 def get_nitter_profile_url(username, nitter_instance):
     return f"{nitter_instance}/{username}"
 
-def parse_nitter_datetime(dt_string):
-    formats = ["%b %d, %Y · %I:%M %p %Z", "%b %d, %Y · %H:%M %Z"]
-    for fmt in formats:
-        try:
-            if "UTC" in dt_string:
-                dt_string_no_tz = dt_string.replace(" UTC", "").strip()
-                dt_obj = datetime.strptime(dt_string_no_tz, fmt.replace(" %Z", ""))
-                return dt_obj.replace(tzinfo=timezone.utc)
-        except ValueError:
-            continue
-    raise ValueError(f"Não foi possível analisar a data/hora: {dt_string}")
-
 def extract_initial_post_data(post_container, base_url):
     link_tag = post_container.find('a', class_='tweet-link')
     post_link = base_url + link_tag['href'] if link_tag else None
@@ -71,50 +77,76 @@ def extract_initial_post_data(post_container, base_url):
             post_datetime = None
     return {"link": post_link, "datetime": post_datetime}
 
-def find_posts_on_profile_page(username, start_date, nitter_instance, driver):
+def find_posts_on_profile_page(username, start_date, nitter_instance, fetcher, health=None, cursor_id=None):
     profile_url = get_nitter_profile_url(username, nitter_instance)
     print(f"\nBuscando links de posts em: {profile_url}")
+    started_at = time.monotonic()
     try:
-        driver.get(profile_url)
-        print("-> Aguardando 5 segundos para a página de perfil carregar...")
-        time.sleep(5)
-        html_content = driver.page_source
+        html_content = fetcher.fetch(profile_url, page_type="profile")
     except Exception as e:
         print(f"!!! Erro de conexão ao acessar {profile_url}: {e}")
+        if health: health.record_failure(nitter_instance)
         return False, []
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_profile_page(html_content)
     posts_containers = soup.find_all('div', class_='timeline-item')
+    notice = None if posts_containers else page_notice(soup)
+    if notice:
+        # Perfil vazio, suspenso ou inexistente: a instância respondeu normalmente, não há o que tentar em outra.
+        print(f"-> Nenhum post em '{username}' ({notice}).")
+        if health: health.record_success(nitter_instance, time.monotonic() - started_at)
+        return True, []
     if not posts_containers:
-        print(f"-> AVISO: Nenhum post encontrado em {nitter_instance}. Instância considerada falha.")
+        print(f"-> AVISO: Nenhum post encontrado em {nitter_instance}. Tentando a próxima instância.")
+        if health: health.record_failure(nitter_instance)
         return False, []
+    if health: health.record_success(nitter_instance, time.monotonic() - started_at)
     print(f"-> Encontrados {len(posts_containers)} posts na página de perfil.")
     links_to_process = []
     for container in posts_containers:
         post = extract_initial_post_data(container, nitter_instance)
-        if post["datetime"] and post["datetime"] > start_date and post["link"]:
+        status_id = extract_status_id(post["link"])
+        if not (post["datetime"] and status_id): continue
+        # Com cursor, o ID do status (crescente) decide com exatidão; sem ele, vale a data.
+        is_new = int(status_id) > int(cursor_id) if cursor_id else post["datetime"] > start_date
+        if is_new:
             links_to_process.append({
                 "username": username,
+                "status_id": status_id,
                 "link": post["link"],
                 "datetime": post["datetime"].isoformat()
             })
     print(f"-> {len(links_to_process)} posts atendem ao critério de data e serão processados.")
     return True, links_to_process
 
-def get_thread_root_url_and_content(post_url, driver, base_url):
+def get_thread_root_url_and_content(post_url, fetcher, base_url, health=None, visited=None):
     print(f"   -> Verificando URL: {post_url}")
+    if visited is not None: visited.append(post_url)
+    started_at = time.monotonic()
     try:
-        driver.get(post_url)
-        time.sleep(3)
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        html_content = fetcher.fetch(post_url, page_type="thread")
+        soup = parse_thread_page(html_content)
     except Exception as e:
         print(f"   -> !!! Erro ao acessar a página do post: {e}")
+        if health: health.record_failure(base_url)
         return None, None
+    if not soup.find('div', class_='main-thread'):
+        notice = page_notice(soup)
+        if health:
+            # Post apagado ou de conta protegida é uma resposta válida; só uma página sem aviso conta como falha.
+            if notice:
+                health.record_success(base_url, time.monotonic() - started_at)
+            else:
+                health.record_failure(base_url)
+        print(f"   -> Post indisponível: {notice or 'página sem a thread'}.")
+        return None, None
+    if health:
+        health.record_success(base_url, time.monotonic() - started_at)
     before_tweet_div = soup.find('div', class_='before-tweet')
     if before_tweet_div and before_tweet_div.find('a'):
         root_href = before_tweet_div.find('a')['href']
         root_url = base_url + root_href
         print(f"   -> Post filho detectado. Navegando para a raiz da thread: {root_url}")
-        return get_thread_root_url_and_content(root_url, driver, base_url)
+        return get_thread_root_url_and_content(root_url, fetcher, base_url, health, visited)
     print(f"   -> Raiz da thread encontrada: {post_url}")
     return post_url, soup
 
@@ -154,185 +186,499 @@ def extract_full_thread_content(soup, base_url):
             content_parts.append(extract_detailed_post_content(post, base_url))
     return content_parts
 
+# --- Etapas de Scraping ---
+def scrape_profile(profile, run_state, health, fetcher, lookback_days=NEW_PROFILE_LOOKBACK_DAYS):
+    """Busca os posts de um perfil, tentando as instâncias da mais saudável para a menos saudável."""
+    username = profile['name']
+    start_date, cursor_id = run_state.cursor_for(username, lookback_days)
+    for instance_url in health.ordered_instances():
+        if not health.is_available(instance_url): continue
+        page_load_success, posts_found = find_posts_on_profile_page(username, start_date, instance_url, fetcher, health, cursor_id)
+        if page_load_success:
+            return posts_found
+    print(f"!!! ERRO GERAL: Nenhuma instância funcional para '{username}'.")
+    return []
+
+def resolve_post(post_data, fetcher, health=None, thread_cache=None, run_state=None):
+    """
+    Resolve a raiz da thread de um post. Retorna (post_data, root_url, soup, visitados)
+    ou None quando o post já foi tratado antes ou a página não pôde ser carregada.
+    """
+    base_instance_url = '/'.join(post_data["link"].split('/')[:3])
+    start_url = post_data["link"]
+    status_id = post_data.get("status_id") or extract_status_id(start_url)
+    if run_state and run_state.is_seen(status_id):
+        print(f"   -> Status {status_id} já visto em execução anterior. Pulando sem download.")
+        metrics.increment("seen_skips")
+        return None
+    if thread_cache:
+        known_root_id, known_root_path = thread_cache.get_root(status_id)
+        if known_root_id and thread_cache.is_fresh(known_root_id):
+            print(f"   -> Raiz {known_root_id} já resolvida e processada recentemente (cache). Pulando sem download.")
+            metrics.increment("thread_cache_skips")
+            if run_state: run_state.mark_seen([status_id])
+            return None
+        if known_root_path:
+            # Raiz conhecida, mas conteúdo expirado: vai direto à raiz sem percorrer as respostas.
+            start_url = base_instance_url + known_root_path
+    visited = []
+    root_url, soup = get_thread_root_url_and_content(start_url, fetcher, base_instance_url, health, visited)
+    if not root_url or not soup: return None
+    return post_data, root_url, soup, visited
+
+def extract_post(resolved, processed_thread_ids, processed_lock, thread_cache=None, run_state=None, store=None, dedup_index=None):
+    """Extrai o conteúdo completo da thread resolvida, se ainda não processada nesta execução."""
+    post_data, root_url, soup, visited = resolved
+    base_instance_url = '/'.join(root_url.split('/')[:3])
+    status_id = post_data.get("status_id") or extract_status_id(post_data["link"])
+    thread_id = extract_status_id(root_url)
+    if not thread_id: return None
+    content_parts = extract_full_thread_content(soup, base_instance_url)
+    if not content_parts: return None
+    if thread_cache:
+        thread_cache.store([post_data["link"]] + visited, root_url)
+    if run_state:
+        run_state.mark_seen([status_id, thread_id] + [extract_status_id(url) for url in visited])
+    # Verificação e registro atômicos: duas respostas da mesma thread nunca geram dois resultados.
+    with processed_lock:
+        if thread_id in processed_thread_ids:
+            print(f"   -> Thread ID {thread_id} já processada. Pulando.")
+            return None
+        processed_thread_ids.add(thread_id)
+    if dedup_index:
+        full_text = "\n".join(part['text'] for part in content_parts if part.get('text'))
+        cluster_id = dedup_index.assign(post_data, thread_id, full_text)
+        if cluster_id != thread_id:
+            print(f"   -> Thread ID {thread_id} é quase-duplicata da thread {cluster_id}. Agrupando e pulando.")
+            return None
+    print(f"   -> Processando nova thread com ID {thread_id}.")
+    post_data["thread_id"] = thread_id
+    post_data["link"] = root_url
+    post_data["content"] = content_parts
+    if store:
+        store.save_thread(post_data, thread_id)
+    return post_data
+
+def get_post_full_text(post):
+    return "\n\n---\n\n".join([part['text'] for part in post.get('content', []) if part.get('text')])
+
+# --- Pipeline em Streaming ---
+class StreamingRun:
+    """
+    Estado compartilhado de uma execução e os handlers das etapas do pipeline
+    (descobrir → resolver thread → extrair → classificar → entregar). Cada post
+    segue para a próxima etapa assim que fica pronto.
+    """
+
+    def __init__(self, profiles_to_scan, config, run_state, health, thread_cache, store, dedup_index, fetcher, progress=None,
+                 dry_run=False):
+        self.config = config
+        # Dry-run (replay): não lê nem grava o cache de vereditos e marca os vereditos gravados como simulação.
+        self.dry_run = dry_run
+        # Sem progresso explícito (ex.: chamada direta), os contadores ficam só em memória.
+        self.progress = progress or RunProgress()
+        self.run_state = run_state
+        self.health = health
+        self.thread_cache = thread_cache
+        self.store = store
+        self.dedup_index = dedup_index
+        self.fetcher = fetcher
+        self.lookback_days = float(config.get("new_profile_lookback_days", NEW_PROFILE_LOOKBACK_DAYS))
+        self.profile_context_map = {p['name']: p['context'] for p in profiles_to_scan}
+
+        self._lock = threading.Lock()
+        self.discovered_posts = []
+        self.final_data = []
+        self.filtered_posts = []
+        self.processed_thread_ids = set()
+        self.processed_lock = threading.Lock()
+
+        # Classificação: pré-filtro local, cache de vereditos e lotes assíncronos ao Gemini.
+        self.prefilter = Prefilter(load_prefilter_rules())
+        self.verdict_cache = VerdictCache(store, TASK_DESCRIPTION)
+        if not dry_run:
+            self.verdict_cache.invalidate_changed_contexts(self.profile_context_map)
+            self.verdict_cache.evict()
+        self.batch_size = max(1, int(config.get("gemini_batch_size", DEFAULT_GEMINI_BATCH_SIZE)))
+        self.batch_linger = float(config.get("gemini_batch_linger_seconds", DEFAULT_BATCH_LINGER_SECONDS))
+        self.gemini_concurrency = int(config.get("gemini_concurrency", DEFAULT_CONCURRENCY))
+        # Threads longas são compactadas antes do envio.
+        self.max_post_tokens = int(config.get("gemini_max_post_tokens", DEFAULT_MAX_POST_TOKENS))
+        self.trim_policy = config.get("gemini_trim_policy", DEFAULT_TRIM_POLICY)
+        self.classifier = AsyncClassifier(
+            TASK_DESCRIPTION,
+            rpm=int(config.get("gemini_rpm", DEFAULT_RPM)),
+            tpm=int(config.get("gemini_tpm", DEFAULT_TPM)),
+            concurrency=self.gemini_concurrency,
+        )
+        self.classify_buffers = {}
+        self.in_flight = {}
+        # Threads que o Gemini não classificou: sem veredito gravado, voltam na próxima execução.
+        self.unclassified = []
+
+        # Entrega: posts relevantes vão para o outbox e saem em pequenos lotes.
+        self.deliver_batch_size = max(1, int(config.get("deliver_batch_size", DEFAULT_DELIVER_BATCH_SIZE)))
+        self.deliver_linger = float(config.get("deliver_linger_seconds", DEFAULT_DELIVER_LINGER_SECONDS))
+        self.pending_deliveries = 0
+        self.oldest_pending_at = None
+        # Filtro opcional da entrega (ex.: reclassificação só entrega vereditos que viraram "sim").
+        self.deliver_filter = None
+
+    def _context_for(self, username):
+        return self.profile_context_map.get(username, "Nenhum contexto específico foi fornecido.")
+
+    # --- Etapa 1: descobrir posts nos perfis ---
+    def discover(self, profile, emit):
+        posts_found = scrape_profile(profile, self.run_state, self.health, self.fetcher, self.lookback_days)
+        self.progress.increment("posts_discovered", len(posts_found))
+        for post_data in posts_found:
+            with self._lock:
+                self.discovered_posts.append(post_data)
+            emit(post_data)
+        self.progress.increment("profiles_done")
+
+    # --- Etapa 2: resolver a raiz da thread ---
+    def resolve(self, post_data, emit):
+        resolved = resolve_post(post_data, self.fetcher, self.health, self.thread_cache, self.run_state)
+        if resolved:
+            emit(resolved)
+
+    # --- Etapa 3: extrair o conteúdo da thread ---
+    def extract(self, resolved, emit):
+        post_data = extract_post(resolved, self.processed_thread_ids, self.processed_lock,
+                                 self.thread_cache, self.run_state, self.store, self.dedup_index)
+        if post_data:
+            with self._lock:
+                self.final_data.append(post_data)
+            self.progress.increment("posts_extracted")
+            emit(post_data)
+
+    # --- Etapa 4: classificar ---
+    def classify(self, post, emit):
+        self._collect_verdicts(emit)
+        full_text = get_post_full_text(post)
+        if not full_text.strip():
+            # Thread só de mídia: sem texto para classificar, fica registrada como não relevante
+            # (sem veredito, voltaria à classificação em toda execução).
+            self._record_verdict(post, False, emit, "Thread sem texto")
+            return
+        local_verdict = self.prefilter.decide(full_text, post['username'])
+        if local_verdict is not None:
+            self._record_verdict(post, local_verdict, emit, "Veredito do pré-filtro")
+            return
+        cached_verdict = None if self.dry_run else self.verdict_cache.get(full_text, self._context_for(post['username']))
+        if cached_verdict is not None:
+            self._record_verdict(post, cached_verdict, emit, "Veredito em cache")
+            return
+        buffer = self.classify_buffers.setdefault(post['username'], {"posts": [], "since": time.monotonic()})
+        buffer["posts"].append((post, full_text))
+        if len(buffer["posts"]) >= self.batch_size:
+            self._submit_batch(post['username'])
+        self._flush_lingering_batches()
+
+    def classify_idle(self, emit):
+        self._collect_verdicts(emit)
+        self._flush_lingering_batches()
+
+    def classify_close(self, emit):
+        for username in list(self.classify_buffers):
+            self._submit_batch(username)
+        for future in list(self.in_flight):
+            future.result()
+        self._collect_verdicts(emit)
+        self.classifier.close()
+
+    def _flush_lingering_batches(self):
+        now = time.monotonic()
+        for username, buffer in list(self.classify_buffers.items()):
+            if now - buffer["since"] >= self.batch_linger:
+                self._submit_batch(username)
+
+    def _submit_batch(self, username):
+        buffer = self.classify_buffers.pop(username, None)
+        if not buffer: return
+        # Contrapressão: com lotes demais em andamento, espera o primeiro terminar antes de enviar outro.
+        while len(self.in_flight) >= self.gemini_concurrency * 2:
+            wait(list(self.in_flight), return_when=FIRST_COMPLETED)
+            self._collect_verdicts(None, only_done=True)
+        batch = buffer["posts"]
+        print(f"\n-> Enviando lote de {len(batch)} posts de '{username}' para classificação.")
+        future = self.classifier.submit([(post['thread_id'], self._prompt_text(post)) for post, full_text in batch], self._context_for(username))
+        self.in_flight[future] = (username, batch)
+
+    def _prompt_text(self, post):
+        """Texto da thread que vai ao Gemini, dentro do orçamento de tokens (o cache usa sempre o texto completo)."""
+        text, saved_tokens = compact_thread(post.get('content', []), self.max_post_tokens, self.trim_policy)
+        if saved_tokens:
+            print(f"   -> Thread {post['thread_id']} compactada ({self.trim_policy}): ~{saved_tokens} tokens a menos.")
+            metrics.increment("posts_trimmed")
+            metrics.increment("llm_tokens_trimmed", saved_tokens)
+        return text
+
+    def _collect_verdicts(self, emit, only_done=True):
+        for future in [f for f in self.in_flight if f.done() or not only_done]:
+            username, batch = self.in_flight.pop(future)
+            verdicts = future.result()
+            current_context = self._context_for(username)
+            for post, full_text in batch:
+                is_relevant = verdicts.get(post['thread_id'])
+                if is_relevant is None:
+                    print(f"   > Sem veredito para {post.get('link', 'N/A')}. Será classificado novamente na próxima execução.")
+                    with self._lock:
+                        self.unclassified.append(post['thread_id'])
+                    continue
+                if not self.dry_run:
+                    self.verdict_cache.put(full_text, current_context, post['username'], is_relevant)
+                self._record_verdict(post, is_relevant, emit, "Veredito")
+
+    def _record_verdict(self, post, is_relevant, emit, label):
+        self.store.save_verdict(post['thread_id'], post['username'], is_relevant, dry_run=self.dry_run)
+        self.progress.increment("posts_classified")
+        if is_relevant:
+            self.progress.increment("posts_relevant")
+            print(f"   > {label}: Relevante. Enviando para entrega: {post.get('link', 'N/A')}")
+            with self._lock:
+                self.filtered_posts.append(post)
+            if emit:
+                emit(post)
+            elif self.deliver_stage:
+                self.deliver_stage.put(post)
+        else:
+            print(f"   > {label}: Não relevante. Ignorando: {post.get('link', 'N/A')}")
+
+    # --- Etapa 5: entregar no Notion ---
+    def deliver(self, post, emit):
+        if self.deliver_filter and not self.deliver_filter(post):
+            return
+        if self.store.is_delivered(post['thread_id']):
+            print(f"  -> Thread {post['thread_id']} já foi enviada ao Notion. Pulando.")
+            return
+        # Outbox durável: o post fica pendente no banco antes do envio e só sai da fila quando o Notion confirma.
+        enqueue_post(self.store, post)
+        self.pending_deliveries += 1
+        self.progress.increment("deliveries_pending")
+        if self.oldest_pending_at is None:
+            self.oldest_pending_at = time.monotonic()
+        if self.pending_deliveries >= self.deliver_batch_size:
+            self._deliver_now()
+        else:
+            self.deliver_idle(emit)
+
+    def deliver_idle(self, emit):
+        if self.pending_deliveries and time.monotonic() - self.oldest_pending_at >= self.deliver_linger:
+            self._deliver_now()
+
+    def deliver_close(self, emit):
+        if self.pending_deliveries:
+            self._deliver_now()
+
+    def _deliver_now(self):
+        print(f"\nENVIANDO {self.pending_deliveries} POSTS PARA O NOTION...")
+        _, failed = deliver_pending(self.store)
+        self.progress.set(deliveries_pending=failed)
+        self.pending_deliveries = 0
+        self.oldest_pending_at = None
+
+    def build_stages(self):
+        queue_size = int(self.config.get("pipeline_queue_size", DEFAULT_QUEUE_SIZE))
+        scrape_workers = max(1, int(self.config.get("scrape_workers", DEFAULT_SCRAPE_WORKERS)))
+        stages = [
+            Stage("descobrir", self.discover, workers=scrape_workers, queue_size=queue_size),
+            Stage("resolver", self.resolve, workers=int(self.config.get("resolve_workers", scrape_workers)), queue_size=queue_size),
+            Stage("extrair", self.extract, workers=int(self.config.get("extract_workers", 1)), queue_size=queue_size),
+        ] + self.build_analysis_stages()
+        self.stages = stages
+        return stages
+
+    def build_analysis_stages(self, deliver=True):
+        """Etapas de classificação e entrega; usadas sozinhas no modo replay (sem `deliver` no dry-run)."""
+        queue_size = int(self.config.get("pipeline_queue_size", DEFAULT_QUEUE_SIZE))
+        # Classificação e entrega têm um único worker (a concorrência do Gemini fica no AsyncClassifier)
+        # e acordam periodicamente para despachar lotes parados.
+        stages = [Stage("classificar", self.classify, queue_size=queue_size,
+                        idle_timeout=1.0, on_idle=self.classify_idle, on_close=self.classify_close)]
+        if deliver:
+            stages.append(Stage("entregar", self.deliver, queue_size=queue_size,
+                                idle_timeout=1.0, on_idle=self.deliver_idle, on_close=self.deliver_close))
+        self.deliver_stage = stages[-1] if deliver else None
+        self.stages = stages
+        return stages
+
 # --- Função Principal Refatorada ---
-def run_full_analysis(profiles_to_scan): # <-- MUDANÇA: O parâmetro agora é a lista de perfis com contexto
-    start_collecting_from = load_last_run_timestamp()
-    
-    nitter_instances = [
-        "https://nitter.net", "https://nitter.tiekoetter.com",
-        "https://nitter.privacyredirect.com", "https://nuku.trabun.org",
-    ]
-
-    print("Iniciando o navegador Selenium em segundo plano...")
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    except Exception as e:
-        print(f"!!! Falha ao iniciar o ChromeDriver: {e}")
-        return 0
+def run_full_analysis(profiles_to_scan, progress=None): # <-- MUDANÇA: O parâmetro agora é a lista de perfis com contexto
+    metrics.reset()
+    # Sem as chaves de API a execução falha aqui, antes de qualquer download.
+    get_model()
+    get_notion_client()
+
+    # Cursores por perfil e índice de status já vistos, em vez de um timestamp global.
+    run_state = RunState()
 
-    all_final_data = []
-    filtered_posts_count = 0
+    config = load_config()
+    # Saúde das instâncias persistida entre execuções: instâncias mortas não são testadas de novo a cada run.
+    health = InstanceHealth(
+        config.get("nitter_instances", DEFAULT_NITTER_INSTANCES),
+        routing=config.get("instance_routing", "fastest"),
+    )
+    host_limiter = HostLimiter(
+        max_concurrent=int(config.get("max_requests_per_instance", MAX_REQUESTS_PER_INSTANCE)),
+        min_interval=float(config.get("min_request_interval", MIN_REQUEST_INTERVAL)),
+    )
+
+    thread_cache = ThreadCache(content_ttl_hours=float(config.get("thread_cache_ttl_hours", CONTENT_TTL_HOURS)))
+
+    # Histórico local em SQLite, gravado incrementalmente; os arquivos JSON viram exportações opcionais.
+    store = Store()
     try:
-        all_posts_to_process = []
-        processed_thread_ids = set()
-        failed_instances = set()
-        
-        # <-- MUDANÇA: O loop de scraping agora itera sobre a lista de perfis
-        for profile in profiles_to_scan:
-            username = profile['name'] # Pega o nome do perfil do dicionário
-            page_successfully_loaded = False
-            for instance_url in nitter_instances:
-                if instance_url in failed_instances: continue
-                
-                # Usa o 'username' para fazer a busca
-                page_load_success, posts_found = find_posts_on_profile_page(username, start_collecting_from, instance_url, driver)
-                
-                if page_load_success:
-                    all_posts_to_process.extend(posts_found)
-                    page_successfully_loaded = True
-                    break
-                else:
-                    failed_instances.add(instance_url)
-            
-            if not page_successfully_loaded:
-                print(f"!!! ERRO GERAL: Nenhuma instância funcional para '{username}'.")
-
-        if all_posts_to_process:
-            print("\n" + "="*50 + "\nINICIANDO PROCESSAMENTO DETALHADO\n" + "="*50)
-            for post_data in all_posts_to_process:
-                base_instance_url = '/'.join(post_data["link"].split('/')[:3])
-                root_url, soup = get_thread_root_url_and_content(post_data["link"], driver, base_instance_url)
-                if not root_url or not soup: continue
-                match = re.search(r'/status/(\d+)', root_url)
-                if not match: continue
-                thread_id = match.group(1)
-                if thread_id in processed_thread_ids:
-                    print(f"   -> Thread ID {thread_id} já processada. Pulando.")
-                    continue
-                print(f"   -> Processando nova thread com ID {thread_id}.")
-                content_parts = extract_full_thread_content(soup, base_instance_url)
-                if content_parts:
-                    post_data["link"] = root_url
-                    post_data["content"] = content_parts
-                    all_final_data.append(post_data)
-                    processed_thread_ids.add(thread_id)
-                time.sleep(random.uniform(1, 2))
-    finally:
-        print("\nFechando o navegador Selenium.")
-        driver.quit()
-
-    output_filename = "extracted_x_posts.json"
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        json.dump(all_final_data, f, ensure_ascii=False, indent=4)
-    print(f"\nExtração concluída! {len(all_final_data)} posts salvos em '{output_filename}'.")
-    
-    if all_final_data:
-        save_latest_timestamp(all_final_data)
-        print("\n" + "="*50 + "\nINICIANDO A ANÁLISE COM A API DO GEMINI\n" + "="*50)
-        
-        task_description = """
-        **1. Your Role and Objective:**
-        You are a specialized AI assistant for an expert airdrop hunter. Your only task is to act as a personalized filter. In each request, you will receive my current "Project & Farming Status" and a "Social Media Post" from that project. Your goal is to determine if the post is relevant **TO ME**, based on my status. If there is no project context and/or my airdrop farming status, consider any relevant signal related to the "Airdrop" theme as a "yes" answer.
+        export_json = config.get("export_json", True)
+        # Quase-duplicatas (cross-posts, citações) são colapsadas em um único registro por cluster.
+        dedup_index = NearDuplicateIndex(store)
+        # Entregas ao Notion que falharam em execuções anteriores são retomadas antes do novo scraping.
+        deliver_pending(store)
 
-        **2. The Core Question:**
-        "Does this post contain new, actionable information for my specific farming strategy, OR does it announce critical, universal airdrop logistics?"
+        # Downloads via HTTP com keep-alive; o Selenium só é iniciado se alguma instância exigir JS.
+        # No serviço do agendador (--service) os navegadores ficam aquecidos entre as rodadas;
+        # "browser_keep_alive" no config.json força o comportamento em qualquer modo.
+        pool_options = {
+            "size": int(config.get("browser_pool_size", BROWSER_POOL_SIZE)),
+            "max_pages": int(config.get("browser_max_pages", MAX_PAGES_PER_BROWSER)),
+            "max_memory_mb": float(config.get("browser_max_memory_mb", MAX_BROWSER_MEMORY_MB)),
+        }
+        if config.get("browser_keep_alive", is_long_running()):
+            browser = SeleniumFetcher(get_shared_browser_pool(**pool_options), owns_pool=False)
+        else:
+            browser = SeleniumFetcher(BrowserPool(**pool_options), owns_pool=True)
+        # No navegador, a espera termina assim que a timeline/thread (ou uma página de erro) aparece.
+        browser_timeouts = {
+            "profile": float(config.get("browser_profile_timeout", BROWSER_READY_TIMEOUTS["profile"])),
+            "thread": float(config.get("browser_thread_timeout", BROWSER_READY_TIMEOUTS["thread"])),
+        }
+        fetcher = NitterFetcher(browser_fetcher=browser, host_limiter=host_limiter, browser_timeouts=browser_timeouts)
 
-        **3. High-Relevance Triggers (Always answer 'yes'):**
-        - **Universal Airdrop Logistics:** The post mentions critical, general information like: a "claim" process, a wallet "checker", official "snapshot" dates, "TGE" (Token Generation Event), token "listing" dates, or new, universal "eligibility" tasks that apply to everyone.
-        - **Strategy-Specific News:** The post announces updates, new tasks, or information **directly related** to the specific network, platform, or campaign mentioned in my "Project & Farming Status".
+        # Pipeline em streaming: cada post passa para a próxima etapa assim que fica pronto,
+        # com filas limitadas entre as etapas.
+        run = StreamingRun(profiles_to_scan, config, run_state, health, thread_cache, store, dedup_index, fetcher, progress)
+        run.progress.set(stage="coletando e analisando", profiles_total=len(profiles_to_scan))
+        # Threads de execuções anteriores que ficaram sem veredito entram direto na classificação.
+        retry_since = (datetime.now(timezone.utc) - timedelta(days=float(config.get("unclassified_retry_days", UNCLASSIFIED_RETRY_DAYS)))).isoformat()
+        unclassified = store.get_unclassified_threads([p['name'] for p in profiles_to_scan], retry_since)
+        if unclassified:
+            print(f"-> {len(unclassified)} threads sem veredito em execuções anteriores voltam para a classificação.")
+        try:
+            with metrics.timer("pipeline"):
+                stages = run.build_stages()
+                classify_stage = next(stage for stage in stages if stage.name == "classificar")
+                run_pipeline(stages, profiles_to_scan, injected=[(classify_stage, unclassified)])
+        finally:
+            fetcher.close()
+            health.save()
+            thread_cache.save()
 
-        **4. Irrelevance Triggers (Always answer 'no'):**
-        - **Different Strategy Announcements:** This is a critical filter. If the post announces a new campaign, integration, or opportunity on a **different network or platform** than the one specified in my "Farming Status", it is considered noise and is NOT relevant.
-        - **General Noise:** General market discussions, price speculation, standard technical updates without direct user rewards, or generic community engagement posts ("GM", "happy Monday").
+        all_final_data = run.final_data
+        filtered_posts = run.filtered_posts
+        filtered_posts_count = len(filtered_posts)
+        # Tempo ocupado de cada etapa do pipeline (somado entre os workers) e contadores de cache.
+        for stage in run.stages:
+            metrics.add_time(f"etapa_{stage.name}", stage.busy_seconds)
+            metrics.increment("stage_items", stage.processed, key=stage.name)
+            metrics.increment("stage_errors", stage.errors, key=stage.name)
+        metrics.increment("posts_extracted", len(run.final_data))
+        metrics.increment("posts_relevant", len(run.filtered_posts))
+        metrics.increment("posts_unclassified", len(run.unclassified))
+        metrics.increment("verdict_cache_hits", run.verdict_cache.hits)
+        metrics.increment("verdict_cache_misses", run.verdict_cache.misses)
+        metrics.increment("prefilter_decided", run.prefilter.calls_saved)
+        metrics.increment("near_duplicates", run.dedup_index.duplicates)
+        if run.dedup_index.duplicates:
+            print(f"-> {run.dedup_index.duplicates} quase-duplicatas agrupadas em threads já coletadas.")
 
-        **5. Example Logic to Follow:**
-        - If my status is "Farming on Bob Network" and the post says "We are now live on Solana!", your answer is 'no'.
-        - If my status is "Farming on Bob Network" and the post says "New quest for all Bob Network users!", your answer is 'yes'.
-        - If my status is "I have 100,000 Lux points" and the post says "The snapshot for Lux points has been taken", your answer is 'yes'.
-        """
-        
-        # <-- MUDANÇA: Cria um mapa de 'username' -> 'contexto' para busca rápida
-        profile_context_map = {p['name']: p['context'] for p in profiles_to_scan}
-
-        filtered_posts = []
-        REQUEST_LIMIT_PER_MINUTE = 9 
-        request_count = 0
-        minute_start_time = time.time()
-
-        for i, post in enumerate(all_final_data):
-            if request_count >= REQUEST_LIMIT_PER_MINUTE:
-                elapsed_time = time.time() - minute_start_time
-                if elapsed_time < 60:
-                    wait_time = 60 - elapsed_time
-                    print(f"\n!!! LIMITE DE RPM ATINGIDO. AGUARDANDO {wait_time:.1f} SEGUNDOS. !!!\n")
-                    time.sleep(wait_time)
-                request_count = 0
-                minute_start_time = time.time()
-            
-            full_text = "\n\n---\n\n".join([part['text'] for part in post.get('content', []) if part.get('text')])
-            if not full_text.strip(): continue
-
-            print(f"\n({i+1}/{len(all_final_data)}) Analisando post de '{post['username']}': {post.get('link', 'N/A')}")
-            
-            # <-- MUDANÇA: Pega o contexto específico para este post usando o mapa
-            current_context = profile_context_map.get(post['username'], "Nenhum contexto específico foi fornecido.")
-            
-            # <-- MUDANÇA: Passa o contexto para a função de análise do Gemini
-            if is_post_related(full_text, task_description, current_context):
-                print("   > Veredito: Relevante. Adicionando ao resultado final.")
-                filtered_posts.append(post)
-            else:
-                print("   > Veredito: Não relevante. Ignorando.")
-            request_count += 1
-        
-        filtered_output_filename = "filtered_posts.json"
-        with open(filtered_output_filename, 'w', encoding='utf-8') as f:
-            json.dump(filtered_posts, f, ensure_ascii=False, indent=4)
-        print("\n" + "="*50 + f"\nANÁLISE CONCLUÍDA! {len(filtered_posts)} posts relevantes salvos.\n" + "="*50)
-
-        if filtered_posts:
-            print("\nINICIANDO ENVIO PARA O NOTION...")
-            for post in filtered_posts:
-                append_post_to_page(post)
-                time.sleep(0.5)
-            print("ENVIO PARA O NOTION CONCLUÍDO!")
-            filtered_posts_count = len(filtered_posts)
+        if export_json:
+            output_filename = "extracted_x_posts.json"
+            with open(output_filename, 'w', encoding='utf-8') as f:
+                json.dump(all_final_data, f, ensure_ascii=False, indent=4)
+            filtered_output_filename = "filtered_posts.json"
+            with open(filtered_output_filename, 'w', encoding='utf-8') as f:
+                json.dump(filtered_posts, f, ensure_ascii=False, indent=4)
+            print(f"\nExtração concluída! {len(all_final_data)} posts salvos em '{output_filename}'.")
         else:
-            print("\nNenhum post relevante para enviar ao Notion.")
-            filtered_posts_count = 0 # Garante que a variável exista
-        
-        timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
-        message = (
-            f"Relatório ({timestamp}):\n"
-            f"Tweets encontrados desde a última execução: {len(all_final_data)}\n"
-            f"Tweets relevantes enviados ao Notion: {filtered_posts_count}"
-        )
-        send_notification_to_notion(message)
-    else:
-        print("\nNenhum post novo coletado, etapa de análise pulada.")
-    
+            print(f"\nExtração concluída! {len(all_final_data)} posts salvos no banco local.")
+
+        # Salvo logo após a análise, antes do relatório (que depende do Notion): um post marcado
+        # como visto nunca volta a custar download nem chamada ao Gemini.
+        if run.discovered_posts:
+            run_state.advance_cursors(run.discovered_posts)
+            run_state.save()
+        else:
+            print("Nenhum post novo encontrado. O arquivo de estado não será atualizado.")
+
+        if all_final_data:
+            prefilter = run.prefilter
+            print(f"\nPré-filtro local: {prefilter.calls_saved} classificações economizadas "
+                  f"({prefilter.decided_relevant} relevantes, {prefilter.decided_irrelevant} irrelevantes, {prefilter.ambiguous} ambíguas).")
+            print(f"Cache de vereditos: {run.verdict_cache.hits} acertos, {run.verdict_cache.misses} falhas.")
+            print("\n" + "="*50 + f"\nANÁLISE CONCLUÍDA! {filtered_posts_count} posts relevantes enviados ao Notion.\n" + "="*50)
+
+            timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
+            message = (
+                f"Relatório ({timestamp}):\n"
+                f"Tweets encontrados desde a última execução: {len(all_final_data)}\n"
+                f"Tweets relevantes enviados ao Notion: {filtered_posts_count}"
+            )
+            run.progress.set(stage="enviando relatório")
+            with metrics.timer("report"):
+                enqueue_notification(store, message)
+                deliver_pending(store)
+        else:
+            print("\nNenhum post novo coletado, etapa de análise pulada.")
+    finally:
+        # Fechado mesmo se a execução falhar: no serviço do agendador o processo continua vivo.
+        store.close()
+
     return filtered_posts_count
 
-def run_with_logging_and_state(profiles_to_scan, run_type="manual"):
-    with open(LOG_FILE, 'w', encoding='utf-8') as log_f:
+RUN_TYPE_LABELS = {"manual": "manual", "scheduled": "automática", "reclassify": "de reclassificação"}
+
+def run_with_logging_and_state(profiles_to_scan, run_type="manual", run_id=None):
+    run_label = RUN_TYPE_LABELS.get(run_type, run_type)
+    # O progresso estruturado (run_progress.json) é o que o painel acompanha durante a execução.
+    progress = RunProgress(run_id, run_type).start()
+    # Log com buffer de linha: o painel lê o arquivo incrementalmente enquanto a execução acontece.
+    with open(LOG_FILE, 'w', encoding='utf-8', buffering=1) as log_f:
         with redirect_stdout(log_f):
-            print(f"--- Iniciando execução {'automática' if run_type == 'scheduled' else 'manual'} em {datetime.now()} ---")
-            posts_sent = run_full_analysis(profiles_to_scan)
+            print(f"--- Iniciando execução {run_label} em {datetime.now()} (ID {progress.run_id}) ---")
+            try:
+                if run_type == "reclassify":
+                    # Contexto editado no painel: só os posts recentes dos perfis alterados são revistos.
+                    from replay import reclassify_changed_profiles
+                    posts_sent = reclassify_changed_profiles(profiles_to_scan, progress)
+                else:
+                    posts_sent = run_full_analysis(profiles_to_scan, progress)
+            except Exception as e:
+                print(f"!!! ERRO FATAL na execução: {e}")
+                progress.finish(error=e)
+                append_metrics_history(metrics.snapshot(run_id=progress.run_id, run_type=run_type, status="failed"))
+                raise
             config = load_config()
             config[f"last_{run_type}_run_timestamp"] = datetime.now().isoformat()
             save_config(config)
-            print(f"--- Execução {'automática' if run_type == 'scheduled' else 'manual'} finalizada em {datetime.now()} ---")
+            progress.finish()
+            # Um registro por execução em run_metrics.jsonl, exibido no painel de métricas.
+            append_metrics_history(metrics.snapshot(run_id=progress.run_id, run_type=run_type, status="finished", posts_sent=posts_sent))
+            print(f"--- Execução {run_label} finalizada em {datetime.now()} ---")
     return posts_sent
 
 # --- Bloco de Execução para o Agendador de Tarefas ---
 if __name__ == "__main__":
+    # Modo serviço: agendador adaptativo por perfil em vez de uma execução única.
+    if "--service" in sys.argv:
+        from scheduler import PollingScheduler
+        PollingScheduler().run_forever()
+        sys.exit(0)
+
+    # Execução em segundo plano iniciada pelo painel: "--run-id <id> --run-type manual".
+    run_id = sys.argv[sys.argv.index("--run-id") + 1] if "--run-id" in sys.argv else None
+    run_type = sys.argv[sys.argv.index("--run-type") + 1] if "--run-type" in sys.argv else "scheduled"
+
     # <-- MUDANÇA: O agendador agora também usa a nova estrutura
     try:
         profiles = load_profiles() # Carrega a lista de dicionários do profiles.json
@@ -342,4 +688,6 @@ if __name__ == "__main__":
 
     if profiles:
         # A função `run_with_logging_and_state` já espera a lista de dicionários
-        run_with_logging_and_state(profiles, run_type="scheduled")
\ No newline at end of file
+        run_with_logging_and_state(profiles, run_type=run_type, run_id=run_id)
+    elif run_id:
+        RunProgress(run_id, run_type).finish(error="Nenhum perfil para analisar.")
@@ -0,0 +1,338 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# --- Constantes ---
+DB_FILE = "x_insight.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    status_id   TEXT PRIMARY KEY,
+    username    TEXT NOT NULL,
+    link        TEXT,
+    datetime    TEXT,
+    thread_id   TEXT,
+    scraped_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_username ON posts(username);
+CREATE INDEX IF NOT EXISTS idx_posts_datetime ON posts(datetime);
+CREATE INDEX IF NOT EXISTS idx_posts_thread ON posts(thread_id);
+
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id     TEXT PRIMARY KEY,
+    username      TEXT NOT NULL,
+    root_url      TEXT,
+    datetime      TEXT,
+    content_json  TEXT NOT NULL,
+    extracted_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_username ON threads(username);
+CREATE INDEX IF NOT EXISTS idx_threads_datetime ON threads(datetime);
+
+CREATE TABLE IF NOT EXISTS verdicts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    thread_id   TEXT NOT NULL,
+    username    TEXT NOT NULL,
+    relevant    INTEGER NOT NULL,
+    decided_at  TEXT NOT NULL,
+    dry_run     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_thread ON verdicts(thread_id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_username ON verdicts(username, decided_at);
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    thread_id        TEXT PRIMARY KEY,
+    username         TEXT NOT NULL,
+    status           TEXT NOT NULL,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    last_error       TEXT,
+    updated_at       TEXT NOT NULL,
+    delivered_at     TEXT,
+    kind             TEXT NOT NULL DEFAULT 'post',
+    payload_json     TEXT,
+    next_attempt_at  REAL NOT NULL DEFAULT 0,
+    parts_sent       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries(status);
+
+CREATE TABLE IF NOT EXISTS verdict_cache (
+    cache_key     TEXT PRIMARY KEY,
+    username      TEXT NOT NULL,
+    context_hash  TEXT NOT NULL,
+    relevant      INTEGER NOT NULL,
+    created_at    REAL NOT NULL,
+    last_used_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdict_cache_username ON verdict_cache(username, context_hash);
+CREATE INDEX IF NOT EXISTS idx_verdict_cache_last_used ON verdict_cache(last_used_at);
+
+CREATE TABLE IF NOT EXISTS simhash_index (
+    thread_id   TEXT PRIMARY KEY,
+    username    TEXT NOT NULL,
+    simhash     INTEGER NOT NULL,
+    band0       INTEGER NOT NULL,
+    band1       INTEGER NOT NULL,
+    band2       INTEGER NOT NULL,
+    band3       INTEGER NOT NULL,
+    band4       INTEGER NOT NULL,
+    band5       INTEGER NOT NULL,
+    band6       INTEGER NOT NULL,
+    band7       INTEGER NOT NULL,
+    cluster_id  TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_simhash_band0 ON simhash_index(band0);
+CREATE INDEX IF NOT EXISTS idx_simhash_band1 ON simhash_index(band1);
+CREATE INDEX IF NOT EXISTS idx_simhash_band2 ON simhash_index(band2);
+CREATE INDEX IF NOT EXISTS idx_simhash_band3 ON simhash_index(band3);
+CREATE INDEX IF NOT EXISTS idx_simhash_band4 ON simhash_index(band4);
+CREATE INDEX IF NOT EXISTS idx_simhash_band5 ON simhash_index(band5);
+CREATE INDEX IF NOT EXISTS idx_simhash_band6 ON simhash_index(band6);
+CREATE INDEX IF NOT EXISTS idx_simhash_band7 ON simhash_index(band7);
+CREATE INDEX IF NOT EXISTS idx_simhash_cluster ON simhash_index(cluster_id);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Store:
+    """
+    Armazenamento local (SQLite em modo WAL) de posts, conteúdo de threads,
+    vereditos do Gemini e status de entrega no Notion. Uma conexão
+    compartilhada, protegida por lock, atende os workers de scraping.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        """Adiciona as colunas criadas depois da primeira versão do banco."""
+        for table, column, definition in (
+            ("deliveries", "kind", "TEXT NOT NULL DEFAULT 'post'"),
+            ("deliveries", "payload_json", "TEXT"),
+            ("deliveries", "next_attempt_at", "REAL NOT NULL DEFAULT 0"),
+            ("deliveries", "parts_sent", "INTEGER NOT NULL DEFAULT 0"),
+            ("verdicts", "dry_run", "INTEGER NOT NULL DEFAULT 0"),
+        ):
+            existing = {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # --- Escrita ---
+    def save_thread(self, post_data, thread_id):
+        """Grava o post descoberto e o conteúdo da thread raiz assim que a extração termina."""
+        now = _now()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO posts (status_id, username, link, datetime, thread_id, scraped_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (post_data.get("status_id") or thread_id, post_data["username"], post_data.get("link"),
+                 post_data.get("datetime"), thread_id, now),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, username, root_url, datetime, content_json, extracted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (thread_id, post_data["username"], post_data.get("link"), post_data.get("datetime"),
+                 json.dumps(post_data.get("content", []), ensure_ascii=False), now),
+            )
+            self.conn.commit()
+
+    def save_verdict(self, thread_id, username, relevant, dry_run=False):
+        """Grava um veredito; os de dry-run ficam marcados e não contam como o veredito atual da thread."""
+        self._execute(
+            "INSERT INTO verdicts (thread_id, username, relevant, decided_at, dry_run) VALUES (?, ?, ?, ?, ?)",
+            (thread_id, username, int(bool(relevant)), _now(), int(dry_run)),
+        )
+
+    def enqueue_delivery(self, delivery_id, username, payload, kind="post"):
+        """
+        Registra uma entrega como pendente no outbox antes de qualquer envio.
+        Entregas já concluídas não voltam para a fila (idempotência por ID).
+        Se o payload mudar, as partes já enviadas deixam de valer e o envio recomeça do início.
+        """
+        now = _now()
+        self._execute(
+            """INSERT INTO deliveries (thread_id, username, status, attempts, updated_at, kind, payload_json, next_attempt_at)
+               VALUES (?, ?, 'pending', 0, ?, ?, ?, 0)
+               ON CONFLICT(thread_id) DO UPDATE SET
+                   parts_sent = CASE WHEN deliveries.payload_json IS excluded.payload_json
+                                     THEN deliveries.parts_sent ELSE 0 END,
+                   payload_json = excluded.payload_json,
+                   updated_at = excluded.updated_at
+               WHERE deliveries.status != 'delivered'""",
+            (delivery_id, username, now, kind, json.dumps(payload, ensure_ascii=False)),
+        )
+
+    def mark_delivery(self, delivery_id, status, error=None, next_attempt_at=0):
+        """Registra o resultado de uma tentativa de entrega ('delivered' ou 'failed')."""
+        now = _now()
+        self._execute(
+            """UPDATE deliveries SET
+                   status = ?,
+                   attempts = attempts + 1,
+                   last_error = ?,
+                   updated_at = ?,
+                   delivered_at = CASE WHEN ? = 'delivered' THEN ? ELSE delivered_at END,
+                   next_attempt_at = ?
+               WHERE thread_id = ?""",
+            (status, error, now, status, now, next_attempt_at, delivery_id),
+        )
+
+    def set_delivery_payload(self, delivery_id, payload):
+        self._execute("UPDATE deliveries SET payload_json = ?, updated_at = ? WHERE thread_id = ?",
+                      (json.dumps(payload, ensure_ascii=False), _now(), delivery_id))
+
+    def set_delivery_parts_sent(self, delivery_id, parts_sent):
+        """Registra quantas partes de um post dividido em várias requisições já chegaram ao Notion."""
+        self._execute("UPDATE deliveries SET parts_sent = ?, updated_at = ? WHERE thread_id = ?",
+                      (parts_sent, _now(), delivery_id))
+
+    def get_due_deliveries(self, now, max_attempts):
+        """Retorna as entregas pendentes ou falhas cujo próximo horário de tentativa já chegou."""
+        rows = self._query(
+            """SELECT thread_id, kind, attempts, payload_json, parts_sent FROM deliveries
+               WHERE status IN ('pending', 'failed') AND next_attempt_at <= ? AND attempts < ?
+               ORDER BY updated_at""",
+            (now, max_attempts),
+        )
+        return [
+            {"delivery_id": row["thread_id"], "kind": row["kind"], "attempts": row["attempts"],
+             "parts_sent": row["parts_sent"],
+             "payload": json.loads(row["payload_json"]) if row["payload_json"] else None}
+            for row in rows
+        ]
+
+    # --- Cache de vereditos ---
+    def get_cached_verdict(self, cache_key, now):
+        """Retorna o veredito em cache (atualizando seu último uso) ou None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT relevant FROM verdict_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE verdict_cache SET last_used_at = ? WHERE cache_key = ?", (now, cache_key))
+            self.conn.commit()
+            return bool(row["relevant"])
+
+    def put_cached_verdict(self, cache_key, username, context_hash, relevant, now):
+        self._execute(
+            "INSERT OR REPLACE INTO verdict_cache (cache_key, username, context_hash, relevant, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (cache_key, username, context_hash, int(bool(relevant)), now, now),
+        )
+
+    def invalidate_cached_verdicts(self, username, current_context_hash):
+        """Remove as entradas de um perfil geradas com um contexto diferente do atual."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM verdict_cache WHERE username = ? AND context_hash != ?", (username, current_context_hash))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def evict_cached_verdicts(self, min_created_at, max_entries):
+        """Aplica o TTL e, acima de `max_entries`, descarta as entradas usadas há mais tempo (LRU)."""
+        with self._lock:
+            self.conn.execute("DELETE FROM verdict_cache WHERE created_at < ?", (min_created_at,))
+            self.conn.execute(
+                """DELETE FROM verdict_cache WHERE cache_key IN (
+                       SELECT cache_key FROM verdict_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)""",
+                (max_entries,),
+            )
+            self.conn.commit()
+
+    # --- Índice de quase-duplicatas ---
+    def find_simhash_candidates(self, bands):
+        """Retorna (thread_id, simhash, cluster_id) das entradas que compartilham ao menos uma banda."""
+        rows = self._query(
+            """SELECT thread_id, simhash, cluster_id FROM simhash_index
+               WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ? OR band4 = ? OR band5 = ? OR band6 = ? OR band7 = ?""",
+            tuple(bands),
+        )
+        return [(row["thread_id"], row["simhash"], row["cluster_id"]) for row in rows]
+
+    def add_simhash(self, thread_id, username, simhash, bands, cluster_id, now):
+        self._execute(
+            """INSERT OR REPLACE INTO simhash_index
+               (thread_id, username, simhash, band0, band1, band2, band3, band4, band5, band6, band7, cluster_id, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (thread_id, username, simhash, *bands, cluster_id, now),
+        )
+
+    def evict_simhashes(self, min_created_at):
+        self._execute("DELETE FROM simhash_index WHERE created_at < ?", (min_created_at,))
+
+    def get_cluster_profiles(self, thread_id):
+        """Perfis que publicaram a thread ou uma quase-duplicata dela, na ordem em que foram vistos."""
+        rows = self._query(
+            "SELECT username FROM simhash_index WHERE cluster_id = ? OR thread_id = ? ORDER BY created_at",
+            (thread_id, thread_id),
+        )
+        return list(dict.fromkeys(row["username"] for row in rows))
+
+    # --- Consultas ---
+    def get_latest_verdict(self, thread_id):
+        rows = self._query(
+            "SELECT relevant FROM verdicts WHERE thread_id = ? AND dry_run = 0 ORDER BY id DESC LIMIT 1", (thread_id,))
+        return bool(rows[0]["relevant"]) if rows else None
+
+    def is_delivered(self, thread_id):
+        rows = self._query("SELECT status FROM deliveries WHERE thread_id = ?", (thread_id,))
+        return bool(rows) and rows[0]["status"] == "delivered"
+
+    def get_unclassified_threads(self, usernames, extracted_since):
+        """Threads extraídas desde `extracted_since` que ainda não têm nenhum veredito (ex.: Gemini indisponível)."""
+        sql = f"""SELECT * FROM threads t
+                  WHERE t.username IN ({', '.join('?' for _ in usernames)}) AND t.extracted_at >= ?
+                    AND NOT EXISTS (SELECT 1 FROM verdicts v WHERE v.thread_id = t.thread_id AND v.dry_run = 0)
+                  ORDER BY t.datetime"""
+        return [_thread_row_to_post(row) for row in self._query(sql, (*usernames, extracted_since))]
+
+    def get_threads(self, usernames=None, since=None, until=None, extracted_since=None):
+        """Retorna threads armazenadas no formato de post do pipeline, com filtros opcionais."""
+        sql = "SELECT * FROM threads WHERE 1 = 1"
+        params = []
+        if usernames:
+            sql += f" AND username IN ({', '.join('?' for _ in usernames)})"
+            params.extend(usernames)
+        if since:
+            sql += " AND datetime >= ?"
+            params.append(since)
+        if until:
+            sql += " AND datetime <= ?"
+            params.append(until)
+        if extracted_since:
+            sql += " AND extracted_at >= ?"
+            params.append(extracted_since)
+        sql += " ORDER BY datetime"
+        return [_thread_row_to_post(row) for row in self._query(sql, params)]
+
+
+def _thread_row_to_post(row):
+    return {
+        "username": row["username"],
+        "thread_id": row["thread_id"],
+        "link": row["root_url"],
+        "datetime": row["datetime"],
+        "content": json.loads(row["content_json"]),
+    }
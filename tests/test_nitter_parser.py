@@ -0,0 +1,89 @@
+"""
+Paridade do caminho rápido do parser (lxml + subárvores) com o parse completo
+pelo 'html.parser', sobre páginas reais do Nitter salvas em tests/fixtures/nitter.
+"""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from nitter_parser import (
+    parse_profile_page, parse_thread_page, parse_nitter_datetime, _parse_nitter_datetime_strptime, page_notice,
+)
+from scraper_logic import extract_initial_post_data, extract_full_thread_content
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "nitter")
+BASE_URL = "https://nitter.example"
+
+PROFILE_PAGES = ["profile.html", "profile_empty.html", "profile_not_found.html", "rate_limited.html"]
+THREAD_PAGES = ["thread_self.html", "thread_reply.html", "thread_deleted.html", "rate_limited.html"]
+
+
+def load(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def before_tweet_href(soup):
+    before = soup.find('div', class_='before-tweet')
+    return before.find('a')['href'] if before and before.find('a') else None
+
+
+@pytest.mark.parametrize("name", PROFILE_PAGES)
+def test_profile_items_match_full_parse(name):
+    html_content = load(name)
+    full_soup = BeautifulSoup(html_content, 'html.parser')
+    fast_soup = parse_profile_page(html_content)
+    expected = [extract_initial_post_data(item, BASE_URL) for item in full_soup.find_all('div', class_='timeline-item')]
+    actual = [extract_initial_post_data(item, BASE_URL) for item in fast_soup.find_all('div', class_='timeline-item')]
+    assert actual == expected
+    assert page_notice(fast_soup) == page_notice(full_soup)
+
+
+@pytest.mark.parametrize("name", THREAD_PAGES)
+def test_thread_content_matches_full_parse(name):
+    html_content = load(name)
+    full_soup = BeautifulSoup(html_content, 'html.parser')
+    fast_soup = parse_thread_page(html_content)
+    assert extract_full_thread_content(fast_soup, BASE_URL) == extract_full_thread_content(full_soup, BASE_URL)
+    assert before_tweet_href(fast_soup) == before_tweet_href(full_soup)
+    assert bool(fast_soup.find('div', class_='main-thread')) == bool(full_soup.find('div', class_='main-thread'))
+    assert page_notice(fast_soup) == page_notice(full_soup)
+
+
+@pytest.mark.parametrize("name", ["profile.html", "thread_self.html", "thread_reply.html"])
+def test_fast_date_parser_matches_strptime(name):
+    titles = [link['title'] for link in BeautifulSoup(load(name), 'html.parser').select('span.tweet-date a[title]')]
+    assert titles
+    for title in titles:
+        assert parse_nitter_datetime(title) == _parse_nitter_datetime_strptime(title)
+
+
+def test_profile_keeps_compound_class_items():
+    # Itens de threads próprias ("timeline-item thread", "... thread-last") não podem sumir no filtro.
+    items = parse_profile_page(load("profile.html")).find_all('div', class_='timeline-item')
+    assert len(items) == 6
+    assert [item['class'] for item in items if 'thread' in item['class']][-1] == ['timeline-item', 'thread', 'thread-last']
+
+
+def test_self_thread_keeps_continuations():
+    parts = extract_full_thread_content(parse_thread_page(load("thread_self.html")), BASE_URL)
+    assert len(parts) == 4
+    assert parts[2] == {"text": "", "attachments": [BASE_URL + "/pic/amplify_video_thumb%2F1846390%2Fimg%2Fseason2.jpg"]}
+
+
+def test_reply_points_to_thread_root():
+    assert before_tweet_href(parse_thread_page(load("thread_reply.html"))) == "/layerzero_core/status/1846390010001000001#m"
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("profile_empty.html", "No items found"),
+    ("profile_not_found.html", 'User "ghost_project" not found'),
+    ("thread_deleted.html", "Tweet not found"),
+    ("rate_limited.html", None),
+])
+def test_page_notices(name, expected):
+    # Páginas vazias ou de erro contam como resposta válida; o limite de requisições é problema da instância.
+    html_content = load(name)
+    assert page_notice(parse_profile_page(html_content)) == expected
+    assert page_notice(parse_thread_page(html_content)) == (None if name == "profile_empty.html" else expected)
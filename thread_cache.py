@@ -0,0 +1,90 @@
+import json
+import re
+import threading
+import time
+
+# --- Constantes ---
+THREAD_CACHE_FILE = "thread_cache.json"
+CONTENT_TTL_HOURS = 6       # Após esse tempo a thread é buscada de novo (pode ter crescido)
+ROOT_TTL_DAYS = 30          # Mapeamentos status -> raiz mais antigos que isso são descartados
+
+
+def extract_status_id(url):
+    """Extrai o ID numérico de uma URL '/usuario/status/<id>'."""
+    match = re.search(r'/status/(\d+)', url or "")
+    return match.group(1) if match else None
+
+
+def extract_status_path(url):
+    """Retorna o caminho '/usuario/status/<id>#m' de uma URL, sem o host da instância."""
+    match = re.search(r'(/[^/]+/status/\d+)', url or "")
+    return f"{match.group(1)}#m" if match else None
+
+
+class ThreadCache:
+    """
+    Cache persistido da resolução de threads: mapeia cada status visitado para o
+    ID da raiz da thread e guarda o caminho da raiz e quando ela foi extraída.
+    O conteúdo das threads fica no banco (Store), não aqui.
+    """
+
+    def __init__(self, path=THREAD_CACHE_FILE, content_ttl_hours=CONTENT_TTL_HOURS, root_ttl_days=ROOT_TTL_DAYS):
+        self.path = path
+        self.content_ttl = content_ttl_hours * 3600
+        self.root_ttl = root_ttl_days * 86400
+        self._lock = threading.Lock()
+        self.roots, self.threads = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Arquivos antigos guardavam o conteúdo das threads; só os metadados são mantidos.
+            threads = {tid: {"root_path": entry.get("root_path"), "fetched_at": entry["fetched_at"]}
+                       for tid, entry in data.get("threads", {}).items()}
+            return data.get("roots", {}), threads
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}, {}
+
+    def _evict(self, now):
+        self.roots = {sid: entry for sid, entry in self.roots.items() if now - entry["resolved_at"] < self.root_ttl}
+        self.threads = {tid: entry for tid, entry in self.threads.items() if now - entry["fetched_at"] < self.root_ttl}
+
+    def save(self):
+        with self._lock:
+            self._evict(time.time())
+            data = {"roots": self.roots, "threads": self.threads}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+
+    def get_root(self, status_id):
+        """Retorna (root_id, root_path) já conhecidos para um status, ou (None, None)."""
+        with self._lock:
+            entry = self.roots.get(status_id)
+            if not entry:
+                return None, None
+            thread = self.threads.get(entry["root_id"], {})
+            return entry["root_id"], thread.get("root_path")
+
+    def is_fresh(self, root_id):
+        """Indica se a thread foi extraída dentro do TTL e pode ser pulada sem novo download."""
+        with self._lock:
+            thread = self.threads.get(root_id)
+            return bool(thread) and time.time() - thread["fetched_at"] < self.content_ttl
+
+    def store(self, visited_urls, root_url):
+        """Registra todos os status visitados até a raiz e o momento em que a thread foi extraída."""
+        root_id = extract_status_id(root_url)
+        if not root_id:
+            return
+        now = time.time()
+        with self._lock:
+            for url in visited_urls:
+                status_id = extract_status_id(url)
+                if status_id:
+                    self.roots[status_id] = {"root_id": root_id, "resolved_at": now}
+            self.roots[root_id] = {"root_id": root_id, "resolved_at": now}
+            self.threads[root_id] = {
+                "root_path": extract_status_path(root_url),
+                "fetched_at": now,
+            }
@@ -1,10 +1,15 @@
 # utils.py
 import json
 import os
+from datetime import datetime
+
+from verdict_cache import context_hash
 
 # --- Constantes de Arquivos ---
 CONFIG_FILE = "config.json"
 PROFILES_FILE = "profiles.json"
+PREFILTER_FILE = "prefilter_rules.json"
+PROFILE_VERSIONS_FILE = "profile_versions.json"
 ENV_FILE = ".env"
 LOG_FILE = "execution.log"
 
@@ -32,9 +37,65 @@ def load_profiles():
         return []
 
 def save_profiles(profiles_list):
-    """Salva a lista de perfis no arquivo JSON."""
+    """
+    Salva a lista de perfis no arquivo JSON e versiona o contexto de cada um pelo
+    hash do conteúdo. Retorna os nomes dos perfis cujo contexto mudou, que ficam
+    pendentes de reclassificação.
+    """
+    previous_contexts = {p['name']: p['context'] for p in load_profiles()}
+    versions = load_profile_versions()
+    changed = []
+    now = datetime.now().isoformat()
+    for profile in profiles_list:
+        name, new_hash = profile['name'], context_hash(profile['context'])
+        entry = versions.get(name)
+        if entry is None:
+            # Perfil novo (ou anterior ao versionamento): não há vereditos antigos a revisar.
+            entry = versions[name] = {"version": 1, "context_hash": new_hash, "reclassified_hash": new_hash, "updated_at": now}
+            if name in previous_contexts and previous_contexts[name] != profile['context']:
+                entry["reclassified_hash"] = context_hash(previous_contexts[name])
+        elif entry["context_hash"] != new_hash:
+            entry.update(version=entry["version"] + 1, context_hash=new_hash, updated_at=now)
+        if entry["context_hash"] != entry["reclassified_hash"]:
+            changed.append(name)
+    # Perfis removidos saem do histórico de versões.
+    versions = {p['name']: versions[p['name']] for p in profiles_list}
     with open(PROFILES_FILE, 'w', encoding='utf-8') as f:
         json.dump(profiles_list, f, ensure_ascii=False, indent=4)
+    save_profile_versions(versions)
+    return changed
+
+def load_profile_versions():
+    """Carrega as versões de contexto dos perfis: {nome: {version, context_hash, reclassified_hash, updated_at}}."""
+    try:
+        with open(PROFILE_VERSIONS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_profile_versions(versions):
+    with open(PROFILE_VERSIONS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(versions, f, indent=4)
+
+def get_profiles_pending_reclassification():
+    """Nomes dos perfis cujo contexto atual ainda não foi usado para reclassificar os posts recentes."""
+    return [name for name, entry in load_profile_versions().items() if entry["context_hash"] != entry["reclassified_hash"]]
+
+def mark_profiles_reclassified(context_hashes):
+    """Registra, para cada perfil, o hash do contexto usado na reclassificação."""
+    versions = load_profile_versions()
+    for name, reclassified_hash in context_hashes.items():
+        if name in versions:
+            versions[name]["reclassified_hash"] = reclassified_hash
+    save_profile_versions(versions)
+
+def load_prefilter_rules():
+    """Carrega as regras do pré-filtro local (palavras-chave e regex por perfil)."""
+    try:
+        with open(PREFILTER_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
 def load_env_vars():
     """Carrega as variáveis do arquivo .env para exibição."""
@@ -53,4 +114,7 @@ def save_env_vars(vars_dict):
     """Salva as chaves de API no arquivo .env."""
     with open(ENV_FILE, 'w', encoding='utf-8') as f:
         for key, value in vars_dict.items():
-            f.write(f'{key}="{value}"\n')
\ No newline at end of file
+            f.write(f'{key}="{value}"\n')
+    # Atualiza o processo atual: os clientes do Gemini e do Notion são recriados no próximo uso.
+    for key, value in vars_dict.items():
+        os.environ[key] = value
\ No newline at end of file
@@ -0,0 +1,64 @@
+import hashlib
+import re
+import time
+
+# --- Constantes ---
+# Incrementar quando o formato do prompt ou da resposta do Gemini mudar, invalidando o cache inteiro.
+PROMPT_VERSION = "1"
+VERDICT_CACHE_TTL_DAYS = 30
+VERDICT_CACHE_MAX_ENTRIES = 50000
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_post_text(text):
+    """Normaliza o texto para que diferenças de caixa e espaçamento não gerem chaves distintas."""
+    return re.sub(r'\s+', ' ', text or "").strip().lower()
+
+
+def context_hash(project_context):
+    return _sha256(project_context or "")
+
+
+class VerdictCache:
+    """
+    Cache persistido (tabela verdict_cache do Store) de vereditos do Gemini,
+    endereçado pelo conteúdo: hash do texto normalizado, do contexto do perfil,
+    da descrição da tarefa e de PROMPT_VERSION.
+    """
+
+    def __init__(self, store, topic_prompt, ttl_days=VERDICT_CACHE_TTL_DAYS, max_entries=VERDICT_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.prompt_hash = _sha256(f"{PROMPT_VERSION}\0{topic_prompt}")
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, post_text, project_context):
+        return _sha256(f"{self.prompt_hash}\0{context_hash(project_context)}\0{normalize_post_text(post_text)}")
+
+    def get(self, post_text, project_context):
+        """Retorna o veredito em cache ou None, contabilizando acertos e falhas."""
+        verdict = self.store.get_cached_verdict(self.make_key(post_text, project_context), time.time())
+        if verdict is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return verdict
+
+    def put(self, post_text, project_context, username, relevant):
+        self.store.put_cached_verdict(
+            self.make_key(post_text, project_context), username, context_hash(project_context), relevant, time.time())
+
+    def invalidate_changed_contexts(self, profile_context_map):
+        """Descarta apenas as entradas dos perfis cujo contexto foi editado desde que foram geradas."""
+        for username, project_context in profile_context_map.items():
+            removed = self.store.invalidate_cached_verdicts(username, context_hash(project_context))
+            if removed:
+                print(f"-> Contexto de '{username}' mudou: {removed} vereditos em cache invalidados.")
+
+    def evict(self):
+        self.store.evict_cached_verdicts(time.time() - self.ttl_seconds, self.max_entries)